@@ -8,12 +8,36 @@ Variable and Dataset classes for handling geographical datasets.
 
 
 # external imports
+import copy
+import types
+import atexit
+import inspect
+import numbers
+import weakref
+import warnings
 import multiprocessing
 import numpy as np
 
 # internal imports
-from ensemble.expand import expandArgumentList, ArgumentError
-import collections
+from ensemble.expand import expandArguments, ArgumentError
+from ensemble.cache import ResultCache, memberFingerprint
+from ensemble.incremental import IncrementalResult
+from processing.journal import taskKey, openJournal
+from processing.multiprocess import getContext, getNP, applyWithBudget, nestedPool, budgetedCall
+from processing.backends import BufferPool
+import collections.abc
+# GeoPy Variables and Datasets receive special treatment, if GeoPy is available
+try:
+    from geodata.base import Variable, Axis, Dataset
+    from geodata.misc import VariableError, DatasetError
+
+except ImportError:
+    # placeholders, so that type checks always fail
+    class Variable(object): pass
+    class Axis(Variable): pass
+    class Dataset(object): pass
+    class VariableError(Exception): pass
+    class DatasetError(Exception): pass
 
 
 # named exception
@@ -28,6 +52,293 @@ def apply_method(member, attr, **kwargs):
     """
     return member, getattr(member, attr)(**kwargs)  # returns a TUPLE!!!
 
+# a function that executes a chain of methods for use in apply_async
+def apply_pipeline(member, stages):
+    """Execute a sequence of method calls ('stages', a list of tuples of method name and keyword arguments) on instance
+    'member'; each stage is applied to the result of the previous stage, or to the same object, if the previous stage
+    returned None (in-place operation); the final object is returned.
+    """
+    obj = member
+
+    for attr, kwargs in stages:
+        result = getattr(obj, attr)(**kwargs)
+
+        if result is not None:
+            obj = result
+    return obj
+
+# registry of members that are shared with worker processes (see EnsembleWrapper, lshared=True)
+_shared_members = None
+
+def _shareMembers(members):
+    """Register members in the worker registry; forked workers inherit the registry of the parent process."""
+    global _shared_members
+    _shared_members = members
+
+# a function that executes a method of a shared member for use in apply_async
+def apply_shared(i, attr, **kwargs):
+    """Execute the method 'attr' of member 'i' in the worker registry with keyword arguments 'kwargs'; only the result
+    is returned (modifications of the member remain in the worker).
+    """
+    return getattr(_shared_members[i], attr)(**kwargs)
+
+# functions that execute a method for a group of members and only return the reduced result, for use in apply_async
+def apply_reduce(members, attr, kwargs_list, reduce):
+    """Execute the method 'attr' for a list of members (with a list of keyword arguments) and combine the results with
+    the binary function 'reduce'; only the partial aggregate is returned.
+    """
+    return fold_results((getattr(member, attr)(**kwargs) for member, kwargs in zip(members, kwargs_list)), reduce)
+
+def apply_shared_reduce(indices, attr, kwargs_list, reduce):
+    """Same as apply_reduce, but for members in the worker registry (see apply_shared)."""
+    return apply_reduce([_shared_members[i] for i in indices], attr, kwargs_list, reduce)
+
+# members that are kept in the memory of persistent workers (see EnsembleWrapper, 'resident' option)
+_resident_members = dict()
+
+def residentVersion(member, lhash=False):
+    """Return the version of a worker-resident member: the 'version' attribute (a counter that has to be incremented,
+    whenever the member is modified), or, if lhash is True, a hash of the member (see memberFingerprint); None means
+    that the version is unknown, and the member has to be sent with every call.
+    """
+
+    if getattr(member, 'version', None) is None and not lhash:
+        return None
+
+    else:
+        return memberFingerprint(member)
+
+def apply_resident(key, version, member, attr, lhash, live, **kwargs):
+    """Execute the method 'attr' of a member that is resident in the worker process with keyword arguments 'kwargs';
+    the member is only sent, if the worker does not hold the current version (otherwise 'member' is None), and it is
+    kept in worker memory for later calls, if its version is known; only the result is returned. Members whose keys
+    are not in 'live' (the members that are still assigned to this worker, or None) are dropped from worker memory.
+    Since modifications are not returned, methods that change the version of a resident member raise an error.
+    """
+
+    if live is not None:
+
+        for stale in set(_resident_members) - live:
+            del _resident_members[stale]
+
+    if member is None:
+        stored, member = _resident_members.get(key, (None, None))
+
+        if stored is None or stored != version:
+            raise EnsembleError("Worker-resident member '{}' is out of date.".format(key[0]))
+
+    elif version is not None:
+        _resident_members[key] = (version, member)
+    result = getattr(member, attr)(**kwargs)
+
+    if version is not None and residentVersion(member, lhash) != version:
+        del _resident_members[key] # the worker copy is no longer the same as the original
+        raise EnsembleError("Method '{}' modified worker-resident member '{}', but modifications are not returned."
+                            .format(attr, key[0]))
+    return result
+
+def _dropResident(pool_ref, key):
+    """Remove the record of a worker-resident member that was garbage-collected from its pool (if the pool still
+    exists), so that workers drop the member as well.
+    """
+    pool = pool_ref()
+
+    if pool is not None:
+        pool.residents.pop(key, None)
+
+# module-managed persistent pool for worker-resident members
+_resident_pool = None
+
+def getResidentPool(NP=None):
+    """Return a persistent, module-managed BufferPool for worker-resident members; the pool is created on first use
+    and only replaced, if the number of workers changes.
+    """
+    global _resident_pool
+
+    if _resident_pool is None or len(_resident_pool) != getNP(NP):
+        closeResidentPool()
+        _resident_pool = BufferPool(processes=NP)
+    return _resident_pool
+
+def closeResidentPool():
+    """Shut down the module-managed pool for worker-resident members, if there is one."""
+    global _resident_pool
+
+    if _resident_pool is not None:
+        _resident_pool.close(); _resident_pool.join()
+        _resident_pool = None
+atexit.register(closeResidentPool)
+
+def memberFootprint(member):
+    """Estimate the memory footprint of an ensemble member in bytes, from the size of the NumPy arrays that it refers
+    to: the member itself, if it is an array, arrays among its attributes (instance dictionary and slots), and arrays
+    in containers (lists, tuples, sets and dicts) and objects (e.g. the Variables of a Dataset) among its attributes,
+    recursively; every object is only counted once, and other attributes are ignored.
+    """
+    nbytes = 0
+    visited = set()
+    objects = [member]
+
+    while objects:
+        obj = objects.pop()
+
+        if id(obj) in visited:
+            continue
+        visited.add(id(obj))
+
+        if isinstance(obj, np.ndarray):
+            nbytes += obj.nbytes
+
+        elif isinstance(obj, dict):
+            objects.extend(obj.values())
+
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            objects.extend(obj)
+
+        elif not (isinstance(obj, (str, bytes, numbers.Number, types.ModuleType)) or inspect.isclass(obj) or
+                  inspect.isroutine(obj)):
+            objects.extend(getattr(obj, '__dict__', dict()).values())
+            slots = set()
+
+            for cls in type(obj).__mro__:
+                # slots are declared per class and can be a single string
+                cls_slots = cls.__dict__.get('__slots__', ())
+                slots.update((cls_slots,) if isinstance(cls_slots, str) else cls_slots)
+
+            objects.extend(getattr(obj, slot, None) for slot in slots - {'__dict__', '__weakref__'}) # can be unset
+    return nbytes
+
+def split_groups(groups, costs, max_memory):
+    """Split contiguous groups of member indices further, so that the sum of the costs (a dict of index: cost) of the
+    members in each group does not exceed 'max_memory' (members that exceed the budget by themselves form a group of
+    their own); the order of the members is preserved.
+    """
+    splits = []
+
+    for group in groups:
+        split = []; total = 0
+
+        for i in group:
+
+            if split and total + costs[i] > max_memory:
+                splits.append(split)
+                split = []; total = 0
+            split.append(i); total += costs[i]
+        splits.append(split)
+    return splits
+
+def option_clashes(method, options):
+    """Return the names of the options (a dict of option name: value) that are set and have the same name as an
+    argument of 'method'; these arguments would be consumed by EnsembleWrapper and never reach the method.
+    """
+
+    try:
+        parameters = inspect.signature(method).parameters
+
+    except (TypeError, ValueError):
+        return [] # no signature available (e.g. some builtins)
+    named = [name for name, param in parameters.items() if param.kind not in (param.VAR_POSITIONAL, param.VAR_KEYWORD)]
+    return [name for name, value in options.items() if value is not None and value is not False and name in named]
+
+def argument_key(kwargs):
+    """Return a hashable key for the keyword arguments of a work unit; hashable arguments are compared by value (and
+    type), other arguments (e.g. arrays) by identity.
+    """
+    items = []
+
+    for key, value in sorted(kwargs.items()):
+
+        try:
+            hash(value)
+            items.append((key, type(value), value))
+
+        except TypeError:
+            items.append((key, 'id', id(value)))
+    return tuple(items)
+
+# content hashes of members with a 'version' attribute (member: (version, hash))
+_content_hashes = weakref.WeakKeyDictionary()
+
+def content_hash(member, idkey='name'):
+    """Return a hash of the content of a member, except the member ID 'idkey' and the version (see memberFingerprint);
+    members with a 'version' attribute are only hashed once per version.
+    """
+    version = getattr(member, 'version', None)
+
+    try:
+        stored = None if version is None else _content_hashes.get(member)
+
+    except TypeError:
+        stored = None # no weak references or not hashable
+
+    if stored is not None and stored[0] == version:
+        return stored[1]
+    fingerprint = memberFingerprint(member, lhash=True, exclude=(idkey, 'version'))
+
+    if version is not None:
+
+        try:
+            _content_hashes[member] = (version, fingerprint)
+
+        except TypeError:
+            pass
+    return fingerprint
+
+def find_duplicates(members, kwargs_list, indices, idkey='name'):
+    """Return a dict that maps the indices of work units (members and keyword arguments) that are identical to an
+    earlier work unit to the index of the earlier work unit. Work units are identical, if the arguments are the same
+    (see argument_key) and the member is the same object or has the same content, apart from the member ID; contents
+    are only hashed (see content_hash) for members with the same arguments, type and footprint (see memberFootprint).
+    """
+    candidates = dict()
+
+    for i in indices:
+        key = (argument_key(kwargs_list[i]), type(members[i]), memberFootprint(members[i]))
+        candidates.setdefault(key, []).append(i)
+    duplicates = dict()
+
+    for group in candidates.values():
+
+        if len(group) == 1:
+            continue # no need to hash members without candidates
+        units = dict(); objects = dict()
+
+        for i in group:
+
+            if id(members[i]) in objects:
+                duplicates[i] = objects[id(members[i])]
+                continue
+            objects[id(members[i])] = i
+            key = content_hash(members[i], idkey=idkey)
+
+            if key in units:
+                duplicates[i] = units[key]
+
+            else:
+                units[key] = i
+    return duplicates
+
+def fold_results(results, reduce):
+    """Combine an iterable of results sequentially with the binary function 'reduce' (only one result is held in
+    memory at a time).
+    """
+    results = iter(results)
+    value = next(results)
+
+    for result in results:
+        value = reduce(value, result)
+    return value
+
+def tree_reduce(values, reduce):
+    """Combine a list of (partial) results pairwise in a tree with the associative binary function 'reduce'; the order
+    of the values is preserved, so 'reduce' does not have to be commutative.
+    """
+    values = list(values)
+
+    while len(values) > 1:
+        values = [reduce(values[i], values[i+1]) if i+1 < len(values) else values[i] for i in range(0, len(values), 2)]
+    return values[0]
+
 
 ## define ensemble wrapper class
 class EnsembleWrapper(object):
@@ -46,13 +357,107 @@ class EnsembleWrapper(object):
         self.klass = klass # the object that the attribute is called on
         self.attr = attr # the attribute name that is called
 
-    def __call__(self, lparallel=False, NP=None, inner_list=None, outer_list=None, callback=None, **kwargs):
+    def _updateMembers(self, members):
+        """Replace the members of the ensemble with the (possibly modified) copies that were returned by workers or
+        restored from a journal, and update the member index, so that access by member ID returns the new members;
+        trackers (see Ensemble.track) re-evaluate members that were replaced.
+        """
+        previous = self.klass.members
+        self.klass.members = members
+        index = getattr(self.klass, '_index', None)
+
+        if index is not None:
+            index.update((getattr(member, self.klass.idkey), member) for member in members)
+        replaced = [new for old,new in zip(previous, members) if new is not old]
+
+        for tracker in getattr(self.klass, 'trackers', []):
+
+            for member in replaced:
+                tracker.add(member) # replaces the existing result
+
+    def __call__(self, lparallel=False, NP=None, inner_list=None, outer_list=None, callback=None, journal=None,
+                 ens_cache=None, backend=None, lshared=False, start_method=None, ens_reduce=None,
+                 ens_max_memory=None, ens_cost=None, ldedup=False, budget=None, resident=None, lhash=False,
+                 ens_constraints=None, **kwargs):
         """This method is called instead of a class or instance method; it applies the arguments 'kwargs' to each ensemble
         member; it also supports argument expansion with inner and outer product (prior to application to ensemble) and
         parallelization using multiprocessing.
+
+        Options with names that member methods are likely to use for their own arguments have the prefix 'ens_' (like
+        the attributes of the Ensemble); if one of the other options is set and the method has an argument with the same
+        name, an ArgumentError is raised, since the argument would not be passed on to the method. Combinations of
+        expanded arguments can be excluded with 'ens_constraints' (see ensemble.expand.expandArgumentList); all other
+        keyword arguments, including 'shard' and 'constraints', are passed on to the method.
+
+        If a journal file (or TaskJournal) is given, the (possibly modified) member and the result of every completed
+        call are recorded, keyed by method name, member ID and arguments; when the call is repeated after a crash,
+        completed members are restored from the journal and only the remaining members are processed.
+
+        If a ResultCache is passed as 'ens_cache' (or True, to use the cache of the ensemble), results are memoized, keyed
+        by member ID and version, method name and arguments, so that only members whose inputs changed are recomputed;
+        this should only be used for methods that do not modify members. (The option is not called 'cache', so that
+        member methods can still receive an argument of that name.)
+
+        If an execution 'backend' is given (see processing.backends), parallel tasks are submitted to the backend
+        instead of a new multiprocessing pool (this implies lparallel=True).
+
+        If 'lshared' is True, members are not sent to the workers with every task: they are registered in a module-level
+        registry before the worker pool is forked, so that workers inherit them (copy-on-write), and only the member
+        index, method name and arguments are sent; only results are returned, i.e. in-place modifications of members
+        are not propagated back. Shared members require the 'fork' start method (an ArgumentError is raised, if another
+        'start_method' is selected or fork is not available) and are not supported with execution backends.
+
+        If a binary associative function or NumPy ufunc (e.g. numpy.add) is passed as 'ens_reduce', only the aggregate
+        of the results is returned, instead of a tuple: in parallel mode, members are divided into one contiguous group
+        per worker, each worker combines the results of its group and only returns the partial aggregate, and the
+        partial aggregates are combined in a tree; in-place modifications of members are not propagated back, the
+        callback function receives the partial aggregates, and 'ens_reduce' has to be picklable. This option can not be
+        combined with a journal or cache. (Aggregation methods often have an argument called 'reduce', which is still
+        passed on to the method.)
+
+        In parallel mode, 'ens_max_memory' limits the estimated memory footprint (in bytes) of the members that are
+        processed concurrently: the footprint of each member is estimated from the size of its arrays (see
+        memberFootprint), or with the function 'ens_cost', which is called with a member, and tasks are only started
+        while the footprint of all running tasks fits into the budget, i.e. fewer workers are used, if members are large
+        (see applyWithBudget). With 'ens_reduce', all members of a group are sent to the worker at once, so groups are
+        split further, if they do not fit into the budget.
+
+        If 'ldedup' is True, identical work units (members with the same content, apart from the member ID, and the same
+        arguments, e.g. from repeated settings in an argument expansion) are only executed once, and copies of the
+        result are used for the others (the callback function is only called once); only the result is copied, i.e.
+        the method should not modify members. Only members with the same arguments, type and estimated footprint are
+        hashed, and members with a 'version' attribute only once per version (see find_duplicates). This can not be
+        combined with 'ens_reduce'.
+
+        If a CoreBudget (or True, for a budget of all available cores) is passed as 'budget', worker processes are
+        allowed to start their own worker pools, and both levels share the cores of the budget: every member task holds
+        one core while it runs, and nested parallel calls in member methods (e.g. apply_along_axis) only draw cores that
+        are free, so that cores are not oversubscribed (see processing.multiprocess.CoreBudget).
+
+        If a BufferPool (or True, for a persistent module-managed pool) is passed as 'resident', members are kept in the
+        memory of its workers between calls: member i is always sent to the same worker, and it is only sent again, if
+        its version changed or the worker was replaced; otherwise only the method name and arguments are sent. Members
+        are versioned with a 'version' attribute (a counter that is incremented, whenever a member is modified), or, if
+        'lhash' is True, with a hash of the member (see ensemble.cache.memberFingerprint); members without a version are
+        sent with every call. Only results are returned, so methods that modify a resident member (i.e. change its
+        version) raise an EnsembleError; modifications of members without a version are lost. Members are dropped from
+        worker memory, after they were garbage-collected in this process. This option implies lparallel=True and can
+        not be combined with shared members, execution backends, 'ens_reduce', core budgets or memory budgets.
         """
+        # options without the 'ens_' prefix must not hide arguments of the member method
+        options = dict(journal=journal, backend=backend, lshared=lshared, start_method=start_method, ldedup=ldedup,
+                       budget=budget, resident=resident, lhash=lhash)
+        clashes = option_clashes(getattr(self.klass.members[0], self.attr), options) if self.klass.members else []
+
+        if clashes:
+            raise ArgumentError("Method '{}' has arguments with the same names as options of the ensemble wrapper: {}"
+                                .format(self.attr, ', '.join(clashes)))
         # expand kwargs to ensemble list
-        kwargs_list = expandArgumentList(inner_list=inner_list, outer_list=outer_list, **kwargs)
+        # N.B.: the options of the expansion are passed explicitly, so that method arguments with the same names (e.g.
+        #       'shard' or 'constraints') are passed on to the method
+        expand_list = kwargs.pop('expand_list', None); lproduct = kwargs.pop('lproduct', 'outer') # legacy options
+        kwargs_list = expandArguments(kwargs, inner_list=inner_list, outer_list=outer_list, expand_list=expand_list,
+                                      lproduct=lproduct, constraints=ens_constraints)
 
         if len(kwargs_list) == 1:
             kwargs_list *= len(self.klass.members)
@@ -60,33 +465,278 @@ class EnsembleWrapper(object):
         elif len(kwargs_list) != len(self.klass.members):
             raise ArgumentError('Length of expanded argument list does not match ensemble size! {} ~= {}'.format(
                 len(kwargs_list), len(self.klass.members)))
+
+        if ens_reduce is not None and (journal is not None or ens_cache is not None or ldedup):
+            raise ArgumentError("The 'ens_reduce' option can not be combined with a journal, cache or deduplication.")
+
+        if budget is not None and not lparallel:
+            raise ArgumentError("Core budgets require parallel execution (lparallel=True).")
+
+        if resident is not None and (lshared or backend is not None or ens_reduce is not None or budget is not None
+                                     or ens_max_memory is not None):
+            raise ArgumentError("Worker-resident members can not be combined with shared members, execution backends, "
+                                "'ens_reduce', core budgets or memory budgets.")
+        members = list(self.klass.members)
+        results = [None]*len(members)
+        # restore members that were already processed from the journal
+        journal = openJournal(journal)
+
+        if journal is None:
+            todo = list(range(len(members)))
+
+        else:
+            keys = [taskKey(self.attr, getattr(member, self.klass.idkey), **kwargs)
+                    for member,kwargs in zip(members,kwargs_list)]
+            todo = [i for i,key in enumerate(keys) if key not in journal]
+
+            for i in set(range(len(members))) - set(todo):
+                members[i], results[i] = journal.result(keys[i])
+        # look up results for unchanged members in the cache
+
+        if ens_cache is True:
+
+            if self.klass.result_cache is None:
+                self.klass.result_cache = ResultCache()
+            ens_cache = self.klass.result_cache
+
+        if ens_cache is not None:
+            cache_keys = {i:taskKey(self.attr, getattr(members[i], self.klass.idkey), memberFingerprint(members[i]),
+                                    **kwargs_list[i]) for i in todo}
+
+            for i in list(todo):
+
+                try:
+                    results[i] = ens_cache.get(cache_keys[i])
+                    todo.remove(i)
+
+                except KeyError:
+                    pass # needs to be computed
+        # only execute identical work units once
+        duplicates = dict() # index: index of identical work unit
+
+        if ldedup:
+            duplicates = find_duplicates(members, kwargs_list, todo, idkey=self.klass.idkey)
+            todo = [i for i in todo if i not in duplicates]
+
+        def fanOut():
+            # copy results to identical work units (members were not modified)
+            for j,i in duplicates.items():
+                results[j] = copy.deepcopy(results[i]) # results can be modified independently
+
+                if journal is not None:
+                    journal.record(keys[j], result=(members[j], results[j]))
+
+                if ens_cache is not None:
+                    ens_cache.put(cache_keys[j], results[j])
         # loop over ensemble members and execute function
+        # N.B.: no worker pool is created, if all results were restored from the journal or cache
 
-        if lparallel:
-            # parallelize method execution using multiprocessing
-            pool = multiprocessing.Pool(processes=NP) # initialize worker pool
+        if todo and (lparallel or backend is not None or resident is not None):
+            # parallelize method execution using multiprocessing or an execution backend
 
-            if callback is not None and not isinstance(callback, collections.Callable):
+            if callback is not None and not isinstance(callback, collections.abc.Callable):
                 raise TypeError(callback)
+
+            if lshared and backend is not None:
+                raise NotImplementedError("Shared members are not supported with execution backends.")
+
+            if lshared:
+                context = getContext(start_method or 'fork')
+
+                if context.get_start_method() != 'fork':
+                    # N.B.: without fork, every worker would have to receive a copy of the entire ensemble
+                    raise ArgumentError("Shared members require the 'fork' start method (not '{}').".format(
+                        context.get_start_method()))
+
+            if budget is not None and backend is not None:
+                raise NotImplementedError("Core budgets are not supported with execution backends.")
+            lbudget = budget is not None
+            budget = None if budget is True else budget # nestedPool creates a new budget
+            # estimate memory footprints for the memory budget
+
+            if ens_max_memory is not None:
+                member_costs = {i:(ens_cost or memberFootprint)(members[i]) for i in todo}
+
+                if ens_cost is None and not any(member_costs.values()):
+                    warnings.warn("No arrays were found in the members, so the memory budget has no effect; use "
+                                  "'ens_cost' to estimate the memory footprint of members.")
+
+            def taskCallback(i):
+                # record results in journal and pass them on to the callback function
+                def recordResult(result):
+                    if lshared or resident is not None: result = (members[i], result) # only results are returned
+                    if journal is not None: journal.record(keys[i], result=result)
+                    if callback is not None: callback(result)
+                return recordResult
             # N.B.: the callback function is passed a result from the apply_method function,
             #       which returns a tuple of the form (member, exit_code)
-            # define work loads (function and its arguments) and start tasks
-            results = [pool.apply_async(apply_method, (member,self.attr), kwargs, callback=callback)
 
-                       for member,kwargs in zip(self.klass.members,kwargs_list)]
-            # N.B.: Beware Pickling!!!
-            pool.close(); pool.join() # wait to finish
+            if lshared:
+                # register members before workers are forked and only send member indices
+                previous = _shared_members
+                _shareMembers(members)
+
+            try:
+
+                if lshared:
+                    pool = nestedPool(NP, budget=budget, context=context) if lbudget else context.Pool(processes=NP)
+
+                elif lbudget:
+                    pool = nestedPool(NP, budget=budget, context=getContext(start_method))
+
+                elif resident is not None:
+                    pool = getResidentPool(NP) if resident is True else resident # persistent workers
+
+                else:
+                    pool = backend or getContext(start_method).Pool(processes=NP) # initialize worker pool
+
+                # define work loads (function, arguments and callback) and the members they process
+
+                if ens_reduce is not None:
+                    # one group of members per worker; workers only return partial aggregates
+                    groups = [group.tolist() for group in np.array_split(todo, min(len(todo), getNP(NP)))]
+
+                    if ens_max_memory is not None and not lshared:
+                        # all members of a group are sent to the worker at once, so the group has to fit the budget
+                        groups = split_groups(groups, member_costs, ens_max_memory)
+                    tasks = []
+
+                    for group in groups:
+                        group_kwargs = [kwargs_list[i] for i in group]
+
+                        if lshared:
+                            args = (group, self.attr, group_kwargs, ens_reduce)
+                            tasks.append((apply_shared_reduce, args, dict(), callback))
+
+                        else:
+                            args = ([members[i] for i in group], self.attr, group_kwargs, ens_reduce)
+                            tasks.append((apply_reduce, args, dict(), callback))
+
+                else:
+                    groups = [[i] for i in todo]
+
+                    if lshared:
+                        tasks = [(apply_shared, (i,self.attr), kwargs_list[i], taskCallback(i)) for i in todo]
+
+                    elif resident is not None:
+                        # route member i to worker i and only send members that the worker does not hold
+                        tasks = []; workers = []; resident_keys = dict()
+
+                        for i in todo:
+                            key = (getattr(members[i], self.klass.idkey), id(members[i]))
+                            version = residentVersion(members[i], lhash)
+                            worker, stored, start = pool.residents.get(key, (i % len(pool), None, None))
+                            lcurrent = version is not None and stored == version and start == pool.starts[worker]
+
+                            if version is not None:
+
+                                if key not in pool.residents:
+
+                                    try:
+                                        weakref.finalize(members[i], _dropResident, weakref.ref(pool), key)
+
+                                    except TypeError:
+                                        pass # no weak references: the member stays in worker memory
+                                pool.residents[key] = (worker, version, pool.starts[worker])
+                            resident_keys[i] = key
+                            args = (key, version, None if lcurrent else members[i], self.attr, lhash)
+                            tasks.append((apply_resident, args, kwargs_list[i], taskCallback(i)))
+                            workers.append(worker)
+                        # the first task of every worker carries the keys of its resident members (for eviction)
+                        live = {worker:set() for worker in workers}
+
+                        for key, (worker, stored, start) in pool.residents.items():
+
+                            if worker in live:
+                                live[worker].add(key)
+
+                        for n, (func, args, kwds, cb) in enumerate(tasks):
+                            keys = live.pop(workers[n], None)
+                            tasks[n] = (func, args + (None if keys is None else frozenset(keys),), kwds, cb)
+
+                    else:
+                        tasks = [(apply_method, (members[i],self.attr), kwargs_list[i], taskCallback(i)) for i in todo]
+                        # N.B.: Beware Pickling!!!
+                # start tasks
+
+                if lbudget:
+                    # every task holds one core of the budget while it runs
+                    tasks = [(budgetedCall, (func, args, kwds), dict(), cb) for func, args, kwds, cb in tasks]
+
+                if resident is not None:
+                    async_results = [pool.apply_async(func, args, kwds, callback=cb, worker=worker)
+                                     for (func, args, kwds, cb), worker in zip(tasks, workers)]
+
+                elif ens_max_memory is None:
+                    async_results = [pool.apply_async(func, args, kwds, callback=cb) for func, args, kwds, cb in tasks]
+
+                else:
+                    # only start tasks while the members in flight fit into the memory budget
+                    # N.B.: all members of a group are in worker memory at the same time, except shared members, which
+                    #       are inherited by the workers and processed one at a time (the largest member determines
+                    #       the additional memory)
+                    costs = [(max if lshared else sum)(member_costs[i] for i in group) for group in groups]
+                    async_results = applyWithBudget(pool, tasks, costs, ens_max_memory)
+
+                if backend is None and resident is None:
+                    pool.close(); pool.join() # wait to finish
+
+            finally:
+
+                if lshared:
+                    _shareMembers(previous) # workers have exited
+
+            if ens_reduce is not None:
+                # combine partial aggregates from workers
+                return tree_reduce([result.get() for result in async_results], ens_reduce)
             # retrieve and assemble results
-            results = [result.get() for result in results]
             # divide members and results (apply_method returns both, in case members were modified)
-            self.klass.members = [result[0] for result in results]
-            results = [result[1] for result in results]
+            errors = []
+
+            for i,result in zip(todo,async_results):
+
+                if resident is not None:
+
+                    try:
+                        results[i] = result.get()
+
+                    except Exception as err:
+                        pool.residents.pop(resident_keys[i], None) # the worker copy is not current (or missing)
+                        errors.append(err)
+                        continue
+
+                elif lshared:
+                    results[i] = result.get()
+
+                else:
+                    members[i], results[i] = result.get()
+
+                if ens_cache is not None:
+                    ens_cache.put(cache_keys[i], results[i])
+
+            if errors:
+                raise errors[0] # after all records of failed worker-resident members were removed
+            fanOut()
+            self._updateMembers(members)
+
+        elif ens_reduce is not None:
+            # apply sequentially and only keep the aggregate
+            return fold_results((getattr(members[i],self.attr)(**kwargs_list[i]) for i in todo), ens_reduce)
 
         else:
-            # get instance methods
-            methods = [getattr(member,self.attr) for member in self.klass.members]
             # just apply sequentially
-            results = [method(**kwargs) for method,kwargs in zip(methods,kwargs_list)]
+            for i in todo:
+                results[i] = getattr(members[i],self.attr)(**kwargs_list[i])
+
+                if journal is not None:
+                    journal.record(keys[i], result=(members[i], results[i]))
+
+                if ens_cache is not None:
+                    ens_cache.put(cache_keys[i], results[i])
+            fanOut()
+
+            if len(todo) < len(members):
+                self._updateMembers(members) # restored from journal
 
         if len(results) != len(self.klass.members):
             raise ArgumentError('Length of results list does not match ensemble size! {} ~= {}'.format(
@@ -94,15 +744,88 @@ class EnsembleWrapper(object):
         return tuple(results)
 
 
+## define pipeline class
+class Pipeline(object):
+    """A class that records a chain of method calls on the members of an ensemble, and executes the entire chain for
+    each member in a single task; intermediate objects never cross process boundaries, and members can proceed to the
+    next stage independently of other members.
+
+    Stages are added by calling methods on the Pipeline instance (or using addStage), with the same argument expansion
+    rules as EnsembleWrapper; every stage is applied to the result of the previous stage (or the same object, if the
+    previous stage returned None). The chain is executed with run().
+    """
+
+    def __init__(self, klass):
+        """The object has to be initialized with the ensemble class 'klass'."""
+        self.klass = klass # the ensemble that the pipeline is applied to
+        self.stages = [] # list of method names and expanded argument lists
+
+    def addStage(self, attr, inner_list=None, outer_list=None, **kwargs):
+        """Add a method call to the pipeline; arguments are expanded to an argument list for each member."""
+        expand_list = kwargs.pop('expand_list', None); lproduct = kwargs.pop('lproduct', 'outer') # legacy options
+        kwargs_list = expandArguments(kwargs, inner_list=inner_list, outer_list=outer_list, expand_list=expand_list,
+                                      lproduct=lproduct)
+
+        if len(kwargs_list) == 1:
+            kwargs_list *= len(self.klass.members)
+
+        elif len(kwargs_list) != len(self.klass.members):
+            raise ArgumentError('Length of expanded argument list does not match ensemble size! {} ~= {}'.format(
+                len(kwargs_list), len(self.klass.members)))
+        self.stages.append((attr, kwargs_list))
+        return self # allow chaining
+
+    def __getattr__(self, attr):
+        """Return a function that adds a stage for method 'attr' to the pipeline."""
+
+        if attr.startswith('_'):
+            raise AttributeError(attr) # don't record special methods
+
+        def stage(**kwargs):
+            return self.addStage(attr, **kwargs)
+        return stage
+
+    def run(self, lparallel=False, NP=None, callback=None, backend=None):
+        """Execute the pipeline for all members and return a tuple of the final results; in parallel mode, only the
+        final results are returned from the workers, i.e. in-place modifications of members are not propagated back.
+        """
+        stages_list = [[(attr, kwargs_list[i]) for attr, kwargs_list in self.stages]
+                       for i in range(len(self.klass.members))]
+
+        if lparallel or backend is not None:
+            # parallelize pipeline execution using multiprocessing or an execution backend
+            pool = backend or multiprocessing.Pool(processes=NP) # initialize worker pool
+            results = [pool.apply_async(apply_pipeline, (member, stages), callback=callback)
+                       for member, stages in zip(self.klass.members, stages_list)]
+
+            if backend is None:
+                pool.close(); pool.join() # wait to finish
+            results = [result.get() for result in results]
+
+        else:
+            # just apply sequentially
+            results = [apply_pipeline(member, stages) for member, stages in zip(self.klass.members, stages_list)]
+        return tuple(results)
+
+
 class Ensemble(object):
     """A container class that holds several datasets ("members" of the ensemble), furthermore, the Ensemble class provides
     functionality to execute Dataset class methods collectively for all members, and return the results in a tuple.
+
+    The state of the ensemble itself is stored in slots and members are indexed by their ID in a separate dictionary,
+    so that member access (ens.memid or ens['memid']) does not compete with ensemble attributes; attributes that are not
+    defined by the ensemble are broadcast to all members.
     """
-    members = None    # list of members of the ensemble
-    basetype = None # base class of the ensemble members
-    idkey = 'name'  # property of members used for unique identification
-    ens_name = ''      # name of the ensemble
-    ens_title = ''      # printable title used for the ensemble
+    __slots__ = ('members',      # list of members of the ensemble
+                 'basetype',     # base class of the ensemble members
+                 'idkey',        # property of members used for unique identification
+                 'ens_name',     # name of the ensemble
+                 'ens_title',    # printable title used for the ensemble
+                 'result_cache', # cache for results of member method calls (see EnsembleWrapper)
+                 'trackers',     # incrementally updated results (see track)
+                 '_index',       # member ID: member
+                 '_attrs',       # additional attributes (keyword arguments)
+                 '__weakref__',)
 
     def __init__(self, *members, **kwargs):
         """Initialize an ensemble from a list of members (the list arguments); keyword arguments are added as attributes
@@ -117,6 +840,10 @@ class Ensemble(object):
         """
         # add members
         self.members = list(members)
+        self.trackers = []
+        self.result_cache = None
+        self._index = dict()
+        self._attrs = dict()
         # add certain properties
         self.ens_name = kwargs.pop('name','')
         self.ens_title = kwargs.pop('title','')
@@ -139,50 +866,156 @@ class Ensemble(object):
 
         if len(members) > 0 and not all(isinstance(member,self.basetype) for member in members):
             raise TypeError("Not all members conform to selected type '{}'".format(self.basetype.__name__))
-        self.idkey = kwargs.get('idkey','name')
+        self.idkey = kwargs.pop('idkey','name')
         # add keywords as attributes
-
-        for key,value in kwargs.items():
-            self.__dict__[key] = value
-        # add short-cuts and keys
-        self.idkeys = []
+        self._attrs.update(kwargs)
+        # index members by ID
 
         for member in self.members:
             memid = getattr(member, self.idkey)
-            self.idkeys.append(memid)
 
             if not isinstance(memid, str):
                 raise TypeError("Member ID key '{:s}' should be a string-type, but received '{:s}'.".format(str(memid),memid.__class__))
 
-            if memid in self.__dict__:
+            if memid in self._index or memid in self._attrs:
                 raise AttributeError("Cannot overwrite existing attribute '{:s}'.".format(memid))
-            self.__dict__[memid] = member
+            self._index[memid] = member
+
+    @classmethod
+    def _fromMembers(cls, members, memids, basetype, idkey='name', name='', title=''):
+        """Create a new Ensemble from members that were already validated by the caller (e.g. a subset of an existing
+        ensemble), without repeating the type and member ID checks; 'memids' are the corresponding member IDs.
+        """
+        ensemble = cls.__new__(cls)
+        ensemble.members = list(members)
+        ensemble.trackers = []
+        ensemble.result_cache = None
+        ensemble.basetype = basetype
+        ensemble.idkey = idkey
+        ensemble.ens_name = name
+        ensemble.ens_title = title
+        ensemble._index = dict(zip(memids, members))
+        ensemble._attrs = dict()
+        return ensemble
+
+    def subset(self, selection):
+        """Return a new Ensemble with a subset of the members; the selection can be a slice, a boolean mask, or a list/
+        tuple/array of member indices or member IDs. The members are shared with this ensemble (not copied) and are not
+        validated again, since they are already part of this ensemble; selecting a member more than once is an error.
+        """
+        members = self.members
+
+        if not isinstance(selection, slice) and any(isinstance(memid, str) for memid in selection) and \
+                not all(isinstance(memid, str) for memid in selection):
+            raise TypeError("Member selections can not mix member IDs and indices: {}".format(list(selection)))
+
+        if isinstance(selection, slice):
+            subset = members[selection]
+            memids = [getattr(member, self.idkey) for member in subset]
+
+        elif len(selection) > 0 and all(isinstance(memid, str) for memid in selection):
+            # look up member IDs in the index of this ensemble
+            subset = []
+
+            for memid in selection:
+                member = self._index.get(memid)
+
+                if member is None:
+                    raise KeyError(memid)
+                subset.append(member)
+            memids = list(selection)
+
+        else:
+            selection = np.asarray(selection)
+
+            if selection.size == 0:
+                subset = []
+
+            elif selection.dtype == np.bool_:
+
+                if selection.shape != (len(members),):
+                    raise IndexError("Boolean mask with shape {} does not match ensemble with {:d} members.".format(selection.shape,len(members)))
+                subset = [members[i] for i in np.flatnonzero(selection)]
+
+            elif np.issubdtype(selection.dtype, np.integer):
+                subset = [members[i] for i in selection]
+
+            else:
+                raise TypeError("Cannot select members with '{}'.".format(selection.dtype))
+            memids = [getattr(member, self.idkey) for member in subset]
+
+        if len(set(memids)) < len(memids):
+            duplicates = sorted(set(memid for memid in memids if memids.count(memid) > 1))
+            raise EnsembleError("Members can only be selected once; duplicate members: {}".format(duplicates))
+        return self._fromMembers(subset, memids, basetype=self.basetype, idkey=self.idkey, name=self.ens_name,
+                                 title=self.ens_title)
+
+    @staticmethod
+    def _checkIDs(memids):
+        """Check that member IDs are unique strings, like the constructor does (for members that skip validation)."""
+
+        for memid in memids:
+
+            if not isinstance(memid, str):
+                raise TypeError("Member ID key '{:s}' should be a string-type, but received '{:s}'.".format(str(memid),memid.__class__))
+
+        if len(set(memids)) < len(memids):
+            raise AttributeError("Cannot overwrite existing attribute '{:s}'.".format(
+                next(memid for memid in memids if memids.count(memid) > 1)))
 
     def _recastList(self, fs):
         """Internal helper method to decide if a list or Ensemble should be returned."""
+        # classify results in a single pass
+        n = len(fs)
+        nnone = nplain = nvar = nax = nds = 0
 
-        if all(f is None for f in fs):
+        for f in fs:
+
+            if f is None:
+                nnone += 1
+                nplain += 1
+
+            elif isinstance(f, Variable):
+                # N.B.: technically, Variable instances are callable, but that's not what we want here...
+                nvar += 1
+
+                if isinstance(f, Axis):
+                    nax += 1
+
+            elif isinstance(f, Dataset):
+                nds += 1
+
+            elif not isinstance(f, collections.abc.Callable):
+                nplain += 1
+
+        if nnone == n:
             return # suppress list of None's
 
-        elif all([not isinstance(f, collections.Callable) and not isinstance(f, (Variable,Dataset)) for f in fs]):
+        elif nplain == n:
             return fs
 
-        elif all([isinstance(f, (Variable,Dataset)) for f in fs]):
+        elif nvar + nds == n:
+            # N.B.: the members and their IDs are validated here, so the new Ensemble can skip validation (_fromMembers)
 
-            # N.B.: technically, Variable instances are callable, but that's not what we want here...
-            if all([isinstance(f, Axis) for f in fs]):
+            if nax == n:
                 return fs
 
             # N.B.: axes are often shared, so we can't have an ensemble
-            elif all([isinstance(f, Variable) for f in fs]):
-
+            elif nvar == n:
                 # check for unique keys
-                if len(fs) == len(set([f.name for f in fs if f.name is not None])):
-                    return Ensemble(*fs, idkey='name') # basetype=Variable,
+                names = [f.name for f in fs]
 
-                elif len(fs) == len(set([f.dataset.name for f in fs if f.dataset is not None])):
+                if None not in names and len(set(names)) == n:
+                    self._checkIDs(names)
+                    return self._fromMembers(fs, names, basetype=Variable, idkey='name')
+
+                datasets = [f.dataset.name for f in fs if f.dataset is not None]
+
+                if len(datasets) == n and len(set(datasets)) == n:
                     #           for f in fs: f.dataset_name = f.dataset.name
-                    return Ensemble(*fs, idkey='dataset_name') # basetype=Variable,
+                    memids = [f.dataset_name for f in fs]
+                    self._checkIDs(memids) # the dataset_name attributes need not match the dataset names
+                    return self._fromMembers(fs, memids, basetype=Variable, idkey='dataset_name')
 
                 else:
                     #raise KeyError, "No unique keys found for Ensemble members (Variables)"
@@ -204,13 +1037,17 @@ class Ensemble(object):
                         else:
                             raise DatasetError(self.idkey)
                     #             f.__dict__[self.idkey] = getattr(member,self.idkey)
-                    return Ensemble(*fs, idkey=self.idkey) # axes from several variables can be the same objects
+                    memids = [getattr(f,self.idkey) for f in fs] # same lookup as in the constructor
+                    self._checkIDs(memids)
+                    return self._fromMembers(fs, memids, basetype=Variable, idkey=self.idkey) # axes from several variables can be the same objects
 
-            elif all([isinstance(f, Dataset) for f in fs]):
+            elif nds == n:
                 # check for unique keys
+                names = [f.name for f in fs]
 
-                if len(fs) == len(set([f.name for f in fs if f.name is not None])):
-                    return Ensemble(*fs, idkey='name') # basetype=Variable,
+                if None not in names and len(set(names)) == n:
+                    self._checkIDs(names)
+                    return self._fromMembers(fs, names, basetype=Dataset, idkey='name')
 
                 else:
                     #           raise KeyError, "No unique keys found for Ensemble members (Datasets)"
@@ -218,7 +1055,9 @@ class Ensemble(object):
 
                     for f,member in zip(fs,self.members):
                         f.name = getattr(member,self.idkey)
-                    return Ensemble(*fs, idkey=self.idkey) # axes from several variables can be the same objects
+                    memids = [getattr(f,self.idkey) for f in fs] # same lookup as in the constructor
+                    self._checkIDs(memids)
+                    return self._fromMembers(fs, memids, basetype=Dataset, idkey=self.idkey) # axes from several variables can be the same objects
 
             else:
                 raise TypeError("Resulting Ensemble members have inconsisent type.")
@@ -238,8 +1077,11 @@ class Ensemble(object):
     def __setattr__(self, attr, value):
         """Redirect setting of attributes to ensemble members if the ensemble class does not have it."""
 
-        if attr in self.__dict__ or attr in Ensemble.__dict__:
-            super(Ensemble, self).__setattr__(attr, value)
+        if attr in Ensemble.__slots__ or hasattr(type(self), attr):
+            object.__setattr__(self, attr, value)
+
+        elif attr in self._attrs:
+            self._attrs[attr] = value
 
         else:
             for member in self.members:
@@ -253,8 +1095,17 @@ class Ensemble(object):
         #       list and applies it over the list of methods from all ensemble members
         # N.B.: this method is only called as a fallback, if no class/instance attribute exists,
         #       i.e. Variable methods and attributes will always have precedent
+
+        if attr.startswith('__') or attr in Ensemble.__slots__:
+            raise AttributeError(attr) # special methods and uninitialized slots (e.g. during unpickling)
+
+        elif attr in self._index:
+            return self._index[attr] # member access by ID
+
+        elif attr in self._attrs:
+            return self._attrs[attr]
         # determine attribute type
-        attrs = [isinstance(getattr(member, attr), collections.Callable) for member in self.members]
+        attrs = [isinstance(getattr(member, attr), collections.abc.Callable) for member in self.members]
 
         if not any(attrs):
             # treat as regular attributes and return list of attibutes of all members
@@ -267,6 +1118,25 @@ class Ensemble(object):
         else:
             raise EnsembleError("Inconsistent attribute type '{}'".format(attr))
 
+    def track(self, attr, **kwargs):
+        """Evaluate method 'attr' with keyword arguments 'kwargs' for all members and return an IncrementalResult, which
+        holds the per-member results and aggregate accumulators (count, sum, mean, min, max); the results are updated
+        incrementally, when members are added or removed, i.e. only new members are evaluated.
+        """
+        tracker = IncrementalResult(self, attr, **kwargs)
+        self.trackers.append(tracker)
+        return tracker
+
+    def untrack(self, tracker):
+        """Stop updating an IncrementalResult."""
+        self.trackers.remove(tracker)
+
+    def pipeline(self):
+        """Return a Pipeline instance that records a chain of member method calls, which can be executed per member in a
+        single task (see Pipeline).
+        """
+        return Pipeline(self)
+
     def __str__(self):
         """Built-in method; we just overwrite to call 'prettyPrint()'."""
         return self.prettyPrint(short=False) # print is a reserved word
@@ -298,20 +1168,20 @@ class Ensemble(object):
             memid = getattr(member,self.idkey)
 
             if member in self.members:
-                assert memid in self.__dict__
-                assert member == self.__dict__[memid]
+                assert memid in self._index
+                assert member == self._index[memid]
                 return True
 
             else:
-                assert memid not in self.__dict__
+                assert memid not in self._index
                 return False
 
         elif isinstance(member, str):
             # assume it is the idkey
 
-            if member in self.__dict__:
-                assert self.__dict__[member] in self.members
-                assert getattr(self.__dict__[member],self.idkey) == member
+            if member in self._index:
+                assert self._index[member] in self.members
+                assert getattr(self._index[member],self.idkey) == member
                 return True
 
             else:
@@ -327,7 +1197,10 @@ class Ensemble(object):
         if not isinstance(member, self.basetype):
             raise TypeError("Ensemble members have to be of '{:s}' type; received '{:s}'.".format(self.basetype.__name__,member.__class__.__name__))
         self.members.append(member)
-        self.__dict__[getattr(member,self.idkey)] = member
+        self._index[getattr(member,self.idkey)] = member
+
+        for tracker in self.trackers:
+            tracker.add(member) # only evaluate new member
         return self.hasMember(member)
 
     def insertMember(self, i, member):
@@ -336,7 +1209,10 @@ class Ensemble(object):
         if not isinstance(member, self.basetype):
             raise TypeError("Ensemble members have to be of '{:s}' type; received '{:s}'.".format(self.basetype.__name__,member.__class__.__name__))
         self.members.insert(i,member)
-        self.__dict__[getattr(member,self.idkey)] = member
+        self._index[getattr(member,self.idkey)] = member
+
+        for tracker in self.trackers:
+            tracker.add(member) # only evaluate new member
         return self.hasMember(member)
 
     def removeMember(self, member):
@@ -349,15 +1225,18 @@ class Ensemble(object):
 
             if isinstance(member, str):
                 memid = member
-                member = self.__dict__[memid]
+                member = self._index[memid]
 
             else:
                 memid = getattr(member,self.idkey)
             assert isinstance(member,self.basetype)
-            # remove from dict
-            del self.__dict__[memid]
+            # remove from index
+            del self._index[memid]
             # remove from list
             del self.members[self.members.index(member)]
+
+            for tracker in self.trackers:
+                tracker.remove(memid)
         # return check
         return not self.hasMember(member)
 
@@ -413,9 +1292,9 @@ class Ensemble(object):
 
         if isinstance(item, str):
 
-            if self.hasMember(item):
+            if item in self._index:
                 # access members like dictionary
-                return self.__dict__[item] # members were added as attributes
+                return self._index[item] # members are indexed by ID
 
             else:
 
@@ -423,7 +1302,7 @@ class Ensemble(object):
                     # dispatch to member attributes
                     atts = [getattr(member,item) for member in self.members]
 
-                    if any([isinstance(att, collections.Callable) and not isinstance(att, (Variable,Dataset)) for att in atts]):
+                    if any([isinstance(att, collections.abc.Callable) and not isinstance(att, (Variable,Dataset)) for att in atts]):
                         raise AttributeError
                     return self._recastList(atts)
                     # N.B.: this is useful to load different Variables from Datasets by name,
@@ -443,10 +1322,8 @@ class Ensemble(object):
             return self.members[item]
 
         elif isinstance(item, (list,tuple,np.ndarray)):
-            # index/label list like ndarray
-            members = [self[i] for i in item] # select members
-            kwargs = dict(basetype=self.basetype, idkey=self.idkey, name=self.ens_name, title=self.ens_title)
-            return Ensemble(*members,**kwargs) # return new ensemble with selected members
+            # index/label list or boolean mask like ndarray
+            return self.subset(item) # return new ensemble with selected members
 
         else:
             raise TypeError
@@ -0,0 +1,239 @@
+"""Created on 2026-10-18
+
+Benchmarks for ensemble method dispatch, argument expansion and parallel execution, using synthetic ensemble members
+with NumPy payloads, so that no external datasets are required. Every measurement is reported as a JSON record (one
+per line), so that results can be stored and compared between versions to detect performance regressions.
+
+Usage (from the src folder): python -m ensemble.benchmark [--quick] [--NP 2] [--output results.jsonl] [wrapper ...]
+
+@author: Andre R. Erler, GPL v3
+"""
+
+
+# external imports
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import itertools
+import multiprocessing
+import numpy as np
+
+# internal imports
+from ensemble.base import Ensemble
+from ensemble.expand import expandArgumentList
+from processing.multiprocess import asyncPoolEC, apply_along_axis, getCPUs
+from processing.serialize import sendObject, recvObject
+
+
+class SyntheticMember(object):
+    """A picklable ensemble member with a NumPy payload of a given size."""
+
+    def __init__(self, name, size=1000):
+        self.name = name
+        self.data = np.random.default_rng(len(name)).random(size)
+
+    def prettyPrint(self, short=False):
+        return 'SyntheticMember {:s} ({:d})'.format(self.name, self.data.size)
+
+    def compute(self, factor=1.):
+        """A cheap reduction, so that dispatch overhead dominates for small payloads."""
+        return float(self.data.sum() * factor)
+
+    def noop(self):
+        """No work and no result: pure dispatch overhead."""
+        return None
+
+
+# task function for asyncPoolEC (has to be a module-level function)
+def noopTask(n, lparallel=False, pidstr='', logger=None, ldebug=False):
+    """A task that does nothing and returns exit code 0."""
+    return 0
+
+# sample function for apply_along_axis
+def sampleMedian(arr, axis=0):
+    """Median of a sample (some non-trivial work per sample)."""
+    return np.median(arr)
+
+
+# echo loops for serialization benchmarks
+def echoDefault(conn):
+    """Send back every object (default pickling), until None is received."""
+
+    for obj in iter(conn.recv, None):
+        conn.send(obj)
+
+def echoBuffers(conn):
+    """Send back every object (out-of-band buffers), until None is received."""
+
+    for obj in iter(lambda: recvObject(conn), None):
+        sendObject(conn, obj)
+
+
+def timeCall(func, repeat=3):
+    """Return the best wall-clock time of 'repeat' calls of 'func'."""
+    times = []
+
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmarkWrapper(nmembers=(10, 100, 1000), sizes=(10, 100000), NP=2, repeat=3):
+    """Overhead of EnsembleWrapper method calls, in serial, parallel and shared-member mode, as a function of member
+    count and payload size, relative to a plain loop over the members.
+    """
+    records = []
+
+    for n, size in itertools.product(nmembers, sizes):
+        ens = Ensemble(*[SyntheticMember('member{:d}'.format(i), size=size) for i in range(n)], basetype=SyntheticMember)
+        direct = timeCall(lambda: [member.compute(factor=2.) for member in ens.members], repeat=repeat)
+
+        for mode in ('serial', 'parallel', 'shared'):
+            kwargs = dict(lparallel=mode != 'serial', lshared=mode == 'shared', NP=NP)
+            elapsed = timeCall(lambda: ens.compute(factor=2., **kwargs), repeat=repeat)
+            records.append(dict(benchmark='wrapper', mode=mode, nmembers=n, size=size,
+                                NP=NP if kwargs['lparallel'] else 1, time=elapsed, direct=direct,
+                                overhead_per_member=(elapsed - direct) / n))
+    return records
+
+
+def benchmarkExpand(sizes=(8, 64, 512, 4096), repeat=3):
+    """Throughput of expandArgumentList (argument dicts per second) as a function of the size of an outer product of
+    three arguments.
+    """
+    records = []
+
+    for size in sizes:
+        k = int(round(size ** (1. / 3.)))
+        values = list(range(k))
+        elapsed = timeCall(lambda: expandArgumentList(a=values, b=values, c=values, d='static',
+                                                      outer_list=['a', 'b', 'c']), repeat=repeat)
+        records.append(dict(benchmark='expand', size=k ** 3, time=elapsed, rate=k ** 3 / elapsed))
+    return records
+
+
+def benchmarkAsyncPool(ntasks=(10, 100), NP=2, repeat=1):
+    """Task rate of asyncPoolEC (tasks per second) with trivial tasks, in serial and parallel mode."""
+    records = []
+    logger = logging.getLogger('multiprocess.asyncPoolEC')
+    disabled = logger.disabled
+    logger.disabled = True # don't mix progress messages with results
+
+    try:
+
+        for n, np_ in itertools.product(ntasks, sorted({1, NP})):
+            args = [(i,) for i in range(n)]
+            elapsed = timeCall(lambda: asyncPoolEC(noopTask, args, dict(), NP=np_, ldebug=False), repeat=repeat)
+            records.append(dict(benchmark='asyncpool', ntasks=n, NP=np_, time=elapsed, rate=n / elapsed))
+
+    finally:
+        logger.disabled = disabled
+    return records
+
+
+def benchmarkApply(shape=(200, 100, 64), chunksizes=(10, 100, 1000), NPs=(1, 2), repeat=1):
+    """Speedup of apply_along_axis relative to numpy.apply_along_axis, as a function of chunksize and NP; the sample
+    axis is the last axis.
+    """
+    records = []
+    data = np.random.default_rng(0).random(shape)
+    serial = timeCall(lambda: np.apply_along_axis(sampleMedian, data.ndim - 1, data), repeat=repeat)
+
+    for chunksize, NP in itertools.product(chunksizes, NPs):
+        elapsed = timeCall(lambda: apply_along_axis(sampleMedian, data.ndim - 1, data, NP=NP, chunksize=chunksize),
+                           repeat=repeat)
+        records.append(dict(benchmark='apply', shape=list(shape), chunksize=chunksize, NP=NP, time=elapsed,
+                            serial=serial, speedup=serial / elapsed))
+    return records
+
+
+def benchmarkSerialize(sizes=(10 ** 4, 10 ** 6, 10 ** 7), repeat=3):
+    """Round-trip time of members with large arrays through a pipe to another process, using default pickling or
+    pickle protocol 5 with out-of-band buffers (see processing.serialize).
+    """
+    records = []
+    modes = dict(default=(echoDefault, lambda conn, obj: conn.send(obj), lambda conn: conn.recv()),
+                 buffers=(echoBuffers, sendObject, recvObject))
+
+    for size in sizes:
+        member = SyntheticMember('member', size=size)
+
+        for mode, (echo, send, recv) in modes.items():
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=echo, args=(child,), daemon=True)
+            process.start()
+            elapsed = timeCall(lambda: (send(conn, member), recv(conn)), repeat=repeat)
+            send(conn, None)
+            process.join()
+            records.append(dict(benchmark='serialize', mode=mode, size=size, nbytes=member.data.nbytes, time=elapsed,
+                                bandwidth=2 * member.data.nbytes / elapsed))
+    return records
+
+
+# available benchmarks, with default and quick settings
+benchmarks = dict(wrapper=(benchmarkWrapper, dict(nmembers=(4, 16), sizes=(10, 1000), repeat=1)),
+                  expand=(benchmarkExpand, dict(sizes=(8, 64), repeat=1)),
+                  asyncpool=(benchmarkAsyncPool, dict(ntasks=(4,))),
+                  apply=(benchmarkApply, dict(shape=(20, 10, 16), chunksizes=(50,), NPs=(1,))),
+                  serialize=(benchmarkSerialize, dict(sizes=(1000, 100000), repeat=1)))
+
+
+def environment():
+    """A record describing the environment, for comparison of results between runs."""
+    return dict(benchmark='environment', python=platform.python_version(), numpy=np.__version__,
+                platform=platform.platform(), ncpus=getCPUs(), date=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def runBenchmarks(names=None, lquick=False, NP=None, stream=None):
+    """Run the selected benchmarks (default: all) and return a list of records; records are also written to 'stream'
+    as JSON lines, if a stream is given. If lquick is True, small problem sizes are used (e.g. for testing).
+    """
+    records = [environment()]
+
+    for name in names or benchmarks:
+        func, quick = benchmarks[name]
+        kwargs = dict(quick) if lquick else dict()
+
+        if NP is not None:
+
+            if name == 'apply':
+                kwargs['NPs'] = (1, NP)
+
+            elif name not in ('expand', 'serialize'):
+                kwargs['NP'] = NP
+        records += func(**kwargs)
+
+    if stream is not None:
+
+        for record in records:
+            stream.write(json.dumps(record) + '\n')
+        stream.flush()
+    return records
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmarks for ensemble dispatch, expansion and parallel apply.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run: {} (default: all)'.format(', '.join(benchmarks)))
+    parser.add_argument('--quick', action='store_true', help='use small problem sizes')
+    parser.add_argument('--NP', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--output', default=None, help='append JSON records to this file (default: stdout)')
+    opts = parser.parse_args()
+
+    for name in opts.names:
+
+        if name not in benchmarks:
+            parser.error('unknown benchmark: {}'.format(name))
+
+    if opts.output is None:
+        runBenchmarks(opts.names, lquick=opts.quick, NP=opts.NP, stream=sys.stdout)
+
+    else:
+
+        with open(opts.output, 'a') as f:
+            runBenchmarks(opts.names, lquick=opts.quick, NP=opts.NP, stream=f)
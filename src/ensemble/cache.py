@@ -0,0 +1,160 @@
+"""Created on 2026-10-18
+
+A content-addressed result cache for Ensemble method calls, with a least-recently-used in-memory store and an
+optional, size-limited disk cache.
+
+@author: Andre R. Erler, GPL v3
+"""
+
+
+# external imports
+import os
+import pickle
+import hashlib
+import collections
+
+
+# collect the attributes of an ensemble member
+def memberAttributes(member):
+    """Return a dict of the attributes of a member, from the instance dictionary and the slots of all classes (slots
+    that are not set are skipped).
+    """
+    attributes = dict(getattr(member, '__dict__', dict()))
+
+    for cls in type(member).__mro__:
+        # slots are declared per class and can be a single string
+        slots = cls.__dict__.get('__slots__', ())
+
+        for slot in (slots,) if isinstance(slots, str) else slots:
+
+            if slot.startswith('__') and not slot.endswith('__'):
+                slot = '_{}{}'.format(cls.__name__.lstrip('_'), slot) # private names are mangled
+
+            if slot not in ('__dict__', '__weakref__') and hasattr(member, slot):
+                attributes[slot] = getattr(member, slot)
+    return attributes
+
+# determine the version of an ensemble member
+def memberFingerprint(member, lhash=False, exclude=()):
+    """Return a version identifier for an ensemble member: the 'version' attribute, if the member has one (cheap),
+    otherwise (or if lhash is True) a hash of the pickled member (content-addressed); attributes in 'exclude' (e.g. the
+    member ID) are not included in the hash, so that members with the same content have the same fingerprint.
+    """
+    version = getattr(member, 'version', None)
+
+    if version is not None and not lhash:
+        return 'version:{}'.format(version)
+
+    elif exclude:
+        # N.B.: attributes in slots have to be excluded as well
+        state = sorted((key,value) for key,value in memberAttributes(member).items() if key not in exclude)
+        return hashlib.sha1(pickle.dumps((type(member), state), protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+    else:
+        return hashlib.sha1(pickle.dumps(member, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+class ResultCache(object):
+    """A cache for results of Ensemble method calls; results are stored in memory with least-recently-used eviction
+    and, if a folder is given, evicted results are spilled to disk as pickle files. The size of the disk cache can be
+    limited (in bytes), in which case the least recently used files are removed.
+
+    Keys are usually generated from the member ID, the member version (see memberFingerprint), the method name and
+    the expanded keyword arguments, so that only members whose inputs changed are recomputed. Cached methods should
+    not modify the members, since only results are cached. Results are stored in pickled form, so that every lookup
+    returns a new copy, which can be modified without affecting the cache.
+    """
+
+    def __init__(self, maxsize=128, folder=None, maxdisk=None):
+        """Initialize the cache.
+
+        Attributes:
+          maxsize      = maximum number of results held in memory
+          folder       = folder for the disk cache (None: no disk cache)
+          maxdisk      = maximum size of the disk cache in bytes (None: no limit)
+        """
+        self.maxsize = maxsize
+        self.folder = folder
+        self.maxdisk = maxdisk
+        self.memory = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        """Path of the pickle file for a given key."""
+        return os.path.join(self.folder, '{:s}.pickle'.format(key))
+
+    def __contains__(self, key):
+        """Check if a result is cached (in memory or on disk)."""
+        return key in self.memory or (self.folder is not None and os.path.exists(self._path(key)))
+
+    def __len__(self):
+        """Return number of results held in memory."""
+        return len(self.memory)
+
+    def get(self, key):
+        """Return a cached result; raises KeyError, if the result is not cached."""
+
+        if key in self.memory:
+            self.memory.move_to_end(key) # most recently used
+            data = self.memory[key]
+
+        elif self.folder is not None and os.path.exists(self._path(key)):
+            # load from disk and promote to memory
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(key)) # mark as recently used
+            self.memory[key] = data
+            self._evict()
+
+        else:
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        return pickle.loads(data) # always return a copy
+
+    def put(self, key, value):
+        """Add a result to the cache."""
+        self.memory[key] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL) # a snapshot of the result
+        self.memory.move_to_end(key)
+        self._evict()
+
+    def clear(self):
+        """Remove all results from memory and disk."""
+        self.memory.clear()
+
+        if self.folder is not None:
+
+            for filename in os.listdir(self.folder):
+
+                if filename.endswith('.pickle'):
+                    os.remove(os.path.join(self.folder, filename))
+
+    def _evict(self):
+        """Remove least recently used results from memory and spill them to disk."""
+
+        while len(self.memory) > self.maxsize:
+            key, data = self.memory.popitem(last=False)
+
+            if self.folder is not None and not os.path.exists(self._path(key)):
+
+                with open(self._path(key), 'wb') as f:
+                    f.write(data)
+
+                if self.maxdisk is not None:
+                    self._trimDisk()
+
+    def _trimDisk(self):
+        """Remove least recently used files from the disk cache, until it is smaller than maxdisk."""
+        files = [os.path.join(self.folder, filename) for filename in os.listdir(self.folder)
+                 if filename.endswith('.pickle')]
+        files.sort(key=os.path.getmtime)
+        size = sum(os.path.getsize(filename) for filename in files)
+
+        while files and size > self.maxdisk:
+            filename = files.pop(0)
+            size -= os.path.getsize(filename)
+            os.remove(filename)
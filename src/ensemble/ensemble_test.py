@@ -15,10 +15,95 @@ import os
 import gc
 from copy import deepcopy
 import shutil
+import pickle
+import tempfile
+import time
 
 # internal imports
-# from ensemble.base import Ensemble
-from ensemble.expand import expandArgumentList
+from ensemble.base import Ensemble, EnsembleError
+from ensemble.expand import expandArgumentList, ArgumentError
+
+
+# a simple, picklable member class for testing
+class DummyMember(object):
+  ''' a minimal Dataset-like member class with a NumPy payload '''
+  
+  def __init__(self, name, size=10):
+    self.name = name
+    self.data = np.arange(size, dtype='float')
+    self.ncalls = 0 # count method calls, to detect (re-)computation
+    
+  def prettyPrint(self, short=False):
+    return 'DummyMember {:s}'.format(self.name)
+  
+  def scale(self, factor=1.):
+    ''' modify member and return a result '''
+    self.ncalls += 1
+    self.data = self.data * factor
+    return self.data.sum()
+  
+  def copy(self, name=None):
+    ''' return a new member '''
+    other = DummyMember(name or self.name, size=len(self.data))
+    other.data = self.data.copy()
+    return other
+  
+  def double(self):
+    ''' in-place operation without return value '''
+    self.data *= 2
+  
+  def norm(self, order=2):
+    ''' return a result without modifying the member '''
+    return np.linalg.norm(self.data, ord=order)
+  
+  def count(self):
+    ''' increment and return the call counter (e.g. of a worker-resident copy) '''
+    self.ncalls += 1
+    return self.ncalls
+  
+  def echo(self, **kwargs):
+    ''' return the keyword arguments that the method received '''
+    return kwargs
+  
+  def span(self, wait=0.1):
+    ''' wait and return the start and end time (as a list, so that spans can be concatenated) '''
+    start = time.time(); time.sleep(wait)
+    return [(start, time.time())]
+  
+  def address(self):
+    ''' return the process ID and object ID of the instance (e.g. of a worker-resident copy) '''
+    return os.getpid(), id(self)
+  
+  def nested(self, nproc=2):
+    ''' a parallel computation inside a member method; returns the number of processes that were used '''
+    from processing.multiprocess import apply_along_axis
+    pids = apply_along_axis(samplePID, 1, np.tile(self.data, (20,1)), NP=nproc, chunksize=2)
+    return len(set(pids))
+
+def samplePID(sample):
+  ''' return the process ID of the process that handles a sample '''
+  return os.getpid()
+
+def countResidents():
+  ''' return the number of members that are resident in this worker process '''
+  from ensemble.base import _resident_members
+  return len(_resident_members)
+
+# a member class without instance dictionary (the member ID is stored in a slot)
+class SlottedMember(object):
+  __slots__ = ('name','data')
+  def __init__(self, name, size=10): self.name = name; self.data = np.arange(size, dtype='float')
+  def norm(self, order=2): return np.linalg.norm(self.data, ord=order)
+
+# minimal stand-ins for GeoPy Variables, Axes and Datasets (only the attributes that are used for member IDs)
+class StubDataset(object):
+  def __init__(self, name): self.name = name
+
+class StubVariable(object):
+  def __init__(self, name, dataset=None, dataset_name=None):
+    self.name = name; self.dataset = dataset; self.dataset_name = dataset_name
+
+class StubAxis(StubVariable): pass
 
 
 ## tests related to loading datasets
@@ -97,6 +182,74 @@ class ArgumentTest(unittest.TestCase):
         n += 1
     assert n == len(arg_list)
     
+  def testExpArgListConstraints(self):
+    ''' test pruning of argument lists with constraints '''
+    args1 = [0,1,2]; args2 = [0,1,2]; args3 = ['a','b']
+    # constraint on the first two arguments: infeasible branches are not expanded further
+    calls = []
+    def ordered(arg1, arg2):
+      calls.append((arg1,arg2)); return arg1 < arg2
+    arg_list = expandArgumentList(arg1=args1, arg2=args2, arg3=args3, arg4='static', outer_list=['arg1','arg2','arg3'], 
+                                  constraints=[ordered])
+    assert len(arg_list) == 3*len(args3)
+    assert all(args['arg1'] < args['arg2'] and args['arg4'] == 'static' for args in arg_list)
+    assert len(calls) == len(args1)*len(args2) # evaluated before arg3 is expanded
+    assert arg_list[0] == dict(arg1=0, arg2=1, arg3='a', arg4='static') # order is preserved
+    # constraints on parallel expansion groups, static and arbitrary arguments
+    arg_list = expandArgumentList(arg1=args1, arg2=args2, arg3=args3, arg4='static', 
+                                  outer_list=[('arg1','arg2'),'arg3'], 
+                                  constraints=[lambda arg2, arg4: arg2 > 0, lambda **kwargs: kwargs['arg3'] == 'b'])
+    assert [(args['arg1'],args['arg3']) for args in arg_list] == [(1,'b'),(2,'b')]
+    # inner product expansion is filtered
+    arg_list = expandArgumentList(arg1=args1, arg2=args2, inner_list=['arg1','arg2'], 
+                                  constraints=[lambda arg1: arg1 != 1])
+    assert [args['arg1'] for args in arg_list] == [0,2]
+    # unknown arguments
+    self.assertRaises(ArgumentError, expandArgumentList, arg1=args1, outer_list=['arg1'], 
+                      constraints=[lambda arg5: True])
+    # outer product arguments that are not present, and no expansion at all: the argument dict is only filtered
+    arg_list = expandArgumentList(arg1=1, arg2=2, outer_list=['arg3'], constraints=[lambda arg1, arg2: arg1 < arg2])
+    assert arg_list == [dict(arg1=1, arg2=2)]
+    assert expandArgumentList(arg1=1, arg2=2, outer_list=['arg3'], constraints=[lambda arg1: arg1 > 1]) == []
+    assert expandArgumentList(arg1=1, constraints=[lambda arg1: arg1 == 1]) == [dict(arg1=1)]
+    assert expandArgumentList(arg1=1, constraints=[lambda arg1: arg1 > 1]) == []
+
+  def testExpArgListShard(self):
+    ''' test deterministic partitioning of argument lists '''
+    args1 = [0,1,2,3]; args2 = ['a','b','c']; args3 = [4,5,6,7]
+    for kwargs in [dict(outer_list=['arg1','arg2']), dict(outer_list=[('arg1','arg3'),'arg2']),
+                   dict(inner_list=['arg1','arg3']), dict(outer_list=['arg1','arg2'], constraints=[lambda arg1: arg1 > 0]),
+                   dict(outer_list=['arg1','arg2'], cost_key=lambda args: args['arg1'])]:
+      arg_list = expandArgumentList(arg1=args1, arg2=args2, arg3=args3, **kwargs)
+      shards = [expandArgumentList(arg1=args1, arg2=args2, arg3=args3, shard=(k,3), **kwargs) for k in range(3)]
+      # partitions are disjoint, complete and balanced (by count or cost)
+      assert sorted([args for shard in shards for args in shard], key=arg_list.index) == arg_list
+      cost = kwargs.get('cost_key', len)
+      loads = [sum(cost(args) for args in shard) for shard in shards]
+      assert max(loads) - min(loads) <= max(cost(args) for args in arg_list)
+    # round-robin assignment
+    arg_list = expandArgumentList(arg1=args1, arg2=args2, outer_list=['arg1','arg2'], shard=(1,5))
+    assert arg_list == [dict(arg1=0, arg2='b'), dict(arg1=2, arg2='a'), dict(arg1=3, arg2='c')]
+    self.assertRaises(ValueError, expandArgumentList, arg1=args1, outer_list=['arg1'], shard=(1,1))
+    # arguments with the same names as options are expanded with expandArguments
+    from ensemble.expand import expandArguments
+    kwargs = dict(shard=[1,2,3], arg1=1)
+    arg_list = expandArguments(kwargs, outer_list=['shard'], shard=(0,2))
+    assert arg_list == [dict(shard=1, arg1=1), dict(shard=3, arg1=1)] and kwargs == dict(shard=[1,2,3], arg1=1)
+
+  def testBatchLoad(self):
+    ''' test batch-loading with argument expansion, constraints and partitioning '''
+    from ensemble.expand import BatchLoad
+    load = BatchLoad(lambda name, size=10: DummyMember(name, size=size))
+    assert load(name='single').name == 'single' # no expansion
+    members = load(name=['a','b','c'], size=[1,2,3], inner_list=['name','size'])
+    assert [(m.name, len(m.data)) for m in members] == [('a',1),('b',2),('c',3)]
+    # constraints and partitions are not passed to the load function
+    members = load(name=['a','b','c'], outer_list=['name'], constraints=[lambda name: name != 'b'], shard=(1,2))
+    assert [m.name for m in members] == ['c']
+    assert [m.name for m in load(name='single', constraints=[lambda name: name != 'single'])] == []
+    assert [m.name for m in load(name='single', shard=(0,1))] == ['single']
+    
 
 ## simple tests for the Container protocol
 class ContainerTest(unittest.TestCase):  
@@ -197,6 +350,395 @@ class MethodTest(unittest.TestCase):
     assert sne[-1] == ens[0] and sne[0] == ens[-1]
 
 
+## tests for the EnsembleWrapper class
+class WrapperTest(unittest.TestCase):  
+    
+  def setUp(self):
+    ''' create an Ensemble with simple test members '''
+    self.folder = tempfile.mkdtemp()
+    self.ens = Ensemble(*[DummyMember('member{:d}'.format(i)) for i in range(4)], basetype=DummyMember)
+  
+  def tearDown(self):
+    ''' clean up '''     
+    shutil.rmtree(self.folder)
+    gc.collect()
+
+  def testJournal(self):
+    ''' test resuming ensemble method calls from a journal '''
+    for lparallel in (False,True):
+      journal = os.path.join(self.folder,'journal_{}.jsonl'.format(lparallel))
+      ens = Ensemble(*[DummyMember('member{:d}'.format(i)) for i in range(3)], basetype=DummyMember)
+      res = ens.scale(factor=2., lparallel=lparallel, NP=2, journal=journal)
+      # a larger ensemble: only the new member is computed, the others are restored from the journal
+      ens = self.ens
+      assert ens.scale(factor=2., lparallel=lparallel, NP=2, journal=journal)[:3] == res
+      assert all(member.ncalls == 1 for member in ens)
+      assert all(member.data[1] == 2. for member in ens)
+      self.ens = Ensemble(*[DummyMember('member{:d}'.format(i)) for i in range(4)], basetype=DummyMember)
+
+  def testCache(self):
+    ''' test memoization of ensemble method calls '''
+    from ensemble.cache import ResultCache
+    ens = self.ens
+    cache = ResultCache(maxsize=2, folder=os.path.join(self.folder,'cache'))
+    res = ens.norm(order=2, ens_cache=cache, lparallel=True, NP=2)
+    assert cache.misses == 4 and cache.hits == 0
+    assert len(cache) == 2 and len(os.listdir(cache.folder)) == 2 # spilled to disk
+    # repeated call: everything is cached (in memory or on disk)
+    assert ens.norm(order=2, ens_cache=cache) == res
+    assert cache.hits == 4 and cache.misses == 4
+    # no workers are needed, if all results are cached (the backend would fail, if it was used)
+    assert ens.norm(order=2, ens_cache=cache, backend=object()) == res
+    assert cache.hits == 8 and cache.misses == 4
+    # modify one member and use different arguments: only changed calls are recomputed
+    ens[0].data[0] = 1.
+    assert ens.norm(order=2, ens_cache=cache)[1:] == res[1:]
+    assert cache.hits == 11 and cache.misses == 5
+    ens.norm(inner_list=['order'], order=[1,2,2,2], ens_cache=cache)
+    assert cache.hits == 14 and cache.misses == 6
+    # ensemble-owned cache
+    assert ens.norm(order=2, ens_cache=True) == ens.norm(order=2, ens_cache=True)
+    assert ens.result_cache.hits == 4
+    # arguments named 'cache' are passed on to the method
+    assert ens.echo(cache='x') == (dict(cache='x'),)*4
+    # size limit for disk cache
+    cache = ResultCache(maxsize=0, folder=os.path.join(self.folder,'small'), maxdisk=1)
+    ens.norm(order=2, ens_cache=cache)
+    assert len(os.listdir(cache.folder)) == 0
+    # cached results are returned as copies
+    cache = ResultCache(maxsize=1)
+    cache.put('key', [1]); cache.get('key').append(2)
+    assert cache.get('key') == [1]
+
+  def testBackend(self):
+    ''' test ensemble method calls on an execution backend '''
+    from processing.backends import ClusterBackend
+    ens = self.ens
+    with ClusterBackend(nworkers=2) as backend:
+      res = ens.scale(factor=2., backend=backend)
+    assert res == tuple(np.arange(10).sum()*2. for member in ens)
+    assert all(member.ncalls == 1 for member in ens)
+
+  def testPipeline(self):
+    ''' test chained ensemble method calls in a pipeline '''
+    ens = self.ens
+    for lparallel in (False,True):
+      pipeline = ens.pipeline().copy(inner_list=['name'], name=['a','b','c','d']).double()
+      assert len(pipeline.stages) == 2
+      pipeline = pipeline.norm(inner_list=['order'], order=[1,1,2,2]) 
+      res = pipeline.run(lparallel=lparallel, NP=2)
+      assert res[:2] == (90.,90.) and res[2:] == (np.linalg.norm(np.arange(10)*2.),)*2
+      assert all(member.data[1] == 1. for member in ens) # stages were applied to copies
+
+  def testIncremental(self):
+    ''' test incremental updates of results when members are added or removed '''
+    ens = self.ens
+    for i,member in enumerate(ens): member.data *= i
+    tracker = ens.track('norm', order=1)
+    assert tracker.nevals == 4 and tracker.count == 4
+    assert tracker.values == tuple(45.*i for i in range(4))
+    assert tracker.mean == 45.*1.5 and tracker.min == 0. and tracker.max == 135.
+    # add members: only new members are evaluated
+    new = DummyMember('new'); new.data *= 10
+    ens += new
+    assert tracker.nevals == 5 and tracker.count == 5 and tracker.max == 450.
+    ens.insertMember(0, DummyMember('first'))
+    assert tracker.nevals == 6 and tracker.values[0] == 45.
+    # remove members: no evaluation, extrema are updated from cached results
+    del ens['new']
+    assert tracker.nevals == 6 and tracker.count == 5 and tracker.max == 135.
+    ens.removeMember('member0')
+    assert tracker.min == 45. and tracker.mean == 45.*7/4
+    # members that are replaced by modified copies from workers are re-evaluated
+    ens.scale(factor=2., lparallel=True, NP=2)
+    assert tracker.nevals == 10 and tracker.values == tuple(2.*value for value in (45.,45.,90.,135.))
+    ens.norm(lparallel=True, NP=2, journal=os.path.join(self.folder,'journal')) # unmodified copies
+    assert tracker.nevals == 14 and tracker.max == 270.
+    ens.untrack(tracker)
+    ens += DummyMember('untracked')
+    assert tracker.count == 4
+
+  def testSubset(self):
+    ''' test selection of ensemble subsets by slice, boolean mask and index/ID lists '''
+    ens = self.ens
+    sub = ens.subset(slice(1,3))
+    assert isinstance(sub, Ensemble) and sub.basetype is DummyMember
+    assert [member.name for member in sub] == ['member1','member2']
+    assert sub.member1 is ens.member1 # members are shared, not copied
+    sub = ens[np.array([True,False,False,True])]
+    assert [member.name for member in sub] == ['member0','member3']
+    sub = ens[[True,True,False,False]]
+    assert [member.name for member in sub] == ['member0','member1']
+    sub = ens[['member2','member0']]
+    assert [member.name for member in sub] == ['member2','member0'] and sub.hasMember('member2')
+    sub = ens[(3,-4)]
+    assert [member.name for member in sub] == ['member3','member0']
+    assert len(ens[[]].members) == 0
+    # the subset is an independent ensemble
+    sub.removeMember('member3')
+    assert ens.hasMember('member3') and len(sub.members) == 1
+    self.assertRaises(KeyError, ens.subset, ['member0','members'])
+    self.assertRaises(IndexError, ens.subset, [True,False])
+    # members can only be selected once, and IDs and indices can not be mixed
+    self.assertRaises(EnsembleError, ens.subset, ['member0','member0'])
+    self.assertRaises(EnsembleError, ens.__getitem__, [0,0])
+    self.assertRaises(EnsembleError, ens.__getitem__, [3,-1])
+    self.assertRaises(TypeError, ens.__getitem__, ['member0',1])
+
+  def testRecast(self):
+    ''' test conversion of member attributes to lists or ensembles of Variables and Datasets '''
+    from unittest import mock
+    import ensemble.base as base
+    ens = self.ens
+    def recast(fs):
+      for member,f in zip(ens,fs): member.attr = f
+      return ens['attr']
+    with mock.patch.multiple(base, Variable=StubVariable, Axis=StubAxis, Dataset=StubDataset):
+      assert recast([None]*4) is None and recast(list(range(4))) == list(range(4))
+      axes = [StubAxis('time') for member in ens]
+      assert recast(axes) == axes # axes are often shared, so no ensemble
+      # variables with unique names
+      var = recast([StubVariable('var{:d}'.format(i)) for i in range(4)])
+      assert var.basetype is StubVariable and var.idkey == 'name' and var.hasMember('var3')
+      self.assertRaises(TypeError, recast, [StubVariable(i) for i in range(4)]) # IDs have to be strings
+      # variables with the same name from different datasets are identified by dataset_name
+      datasets = [StubDataset('ds{:d}'.format(i)) for i in range(4)]
+      var = recast([StubVariable('var', dataset=ds, dataset_name=ds.name) for ds in datasets])
+      assert var.idkey == 'dataset_name' and var.hasMember('ds2')
+      # ... which also has to be unique and a string
+      self.assertRaises(TypeError, recast, [StubVariable('var', dataset=ds) for ds in datasets])
+      self.assertRaises(AttributeError, recast, [StubVariable('var', dataset=ds, dataset_name='ds') for ds in datasets])
+      # otherwise the ID key of the ensemble has to be available, but it can not be overwritten
+      self.assertRaises(base.DatasetError, recast, [StubVariable('var') for member in ens])
+      # datasets without unique names are renamed
+      ds = recast([StubDataset('ds') for member in ens])
+      assert ds.basetype is StubDataset and [d.name for d in ds] == [member.name for member in ens]
+      self.assertRaises(TypeError, recast, [StubDataset('ds'), StubVariable('var')]*2) # inconsistent types
+      # with a different ID key, the new ensemble is indexed like the constructor would index it
+      members = [DummyMember('member{:d}'.format(i)) for i in range(4)]
+      for i,member in enumerate(members): member.label = 'label{:d}'.format(i)
+      ens = Ensemble(*members, basetype=DummyMember, idkey='label')
+      datasets = [StubDataset('ds') for member in ens]
+      for i,d in enumerate(datasets): d.label = 'ds{:d}'.format(i)
+      ds = recast(datasets)
+      assert ds.idkey == 'label' and [d.name for d in ds] == ['label{:d}'.format(i) for i in range(4)]
+      assert ds.hasMember('ds2') and ds['ds2'] is datasets[2] and not ds.hasMember('label2')
+      for d in datasets: d.name = d.label = 'ds'
+      self.assertRaises(AttributeError, recast, datasets) # IDs have to be unique
+
+  def testNamespace(self):
+    ''' test separation of ensemble attributes and member access '''
+    ens = Ensemble(*[DummyMember(name) for name in ('members','idkey','member2')], basetype=DummyMember,
+                   name='test', source='dummy')
+    assert not hasattr(ens, '__dict__') # ensemble state is stored in slots
+    # members are accessed through their own namespace and can't shadow ensemble attributes
+    assert isinstance(ens.members, list) and ens.idkey == 'name'
+    assert ens['members'].name == 'members' and ens.member2 is ens.members[2]
+    assert ens.source == 'dummy' and ens.ens_name == 'test'
+    # unknown attributes are broadcast to the members
+    ens.ncalls = 3
+    assert ens.ncalls == [3,3,3]
+    ens.ens_title = 'Test'
+    assert ens.ens_title == 'Test' and not hasattr(ens.members[0], 'ens_title')
+    # ensembles can be pickled
+    copy = pickle.loads(pickle.dumps(ens))
+    assert copy.member2.name == 'member2' and copy.source == 'dummy' and len(copy) == 3
+
+  def testShared(self):
+    ''' test index-only dispatch with members that are shared with forked workers '''
+    ens = self.ens
+    res = ens.norm(order=1)
+    assert ens.norm(order=1, lparallel=True, NP=2, lshared=True) == res
+    assert ens.norm(order=1, lparallel=True, NP=2, lshared=True, start_method='fork') == res
+    # members are not sent back, so in-place modifications are not propagated
+    members = list(ens.members)
+    assert ens.scale(factor=2., lparallel=True, NP=2, lshared=True) == tuple(2*r for r in res)
+    assert all(m1 is m2 for m1,m2 in zip(ens.members,members)) and ens.member1.data[1] == 1.
+    # journal records and callbacks still receive members and results
+    results = []
+    journal = os.path.join(self.folder,'journal.jsonl')
+    ens.norm(order=1, lparallel=True, NP=2, lshared=True, callback=results.append, journal=journal)
+    assert sorted(result[1] for result in results) == sorted(res)
+    assert ens.norm(order=1, lparallel=True, NP=2, lshared=True, journal=journal) == res
+    # workers have to be forked, and the registry is restored, even if an error occurs
+    import ensemble.base as base
+    self.assertRaises(ArgumentError, ens.norm, order=1, lparallel=True, NP=2, lshared=True, start_method='spawn')
+    self.assertRaises(ValueError, ens.norm, order=1, lparallel=True, NP=0, lshared=True) # pool without workers
+    assert base._shared_members is None
+
+  def testReduce(self):
+    ''' test reduction of results inside workers '''
+    ens = self.ens
+    for i,member in enumerate(ens): member.data *= i+1
+    res = ens.norm(order=1)
+    assert ens.norm(order=1, ens_reduce=np.add) == sum(res)
+    assert ens.norm(order=1, ens_reduce=np.maximum, lparallel=True, NP=2) == max(res)
+    assert ens.norm(order=1, ens_reduce=np.add, lparallel=True, NP=3, lshared=True) == sum(res)
+    # partial aggregates are passed to the callback
+    partials = []
+    assert ens.norm(order=1, ens_reduce=np.add, lparallel=True, NP=2, callback=partials.append) == sum(res)
+    assert sorted(partials) == [res[0]+res[1],res[2]+res[3]]
+    self.assertRaises(ArgumentError, ens.norm, order=1, ens_reduce=np.add, ens_cache=True)
+    # arguments named 'reduce' are passed on to the method
+    assert ens.echo(reduce=np.add, lparallel=True, NP=2) == (dict(reduce=np.add),)*4
+
+  def testMemoryBudget(self):
+    ''' test admission control with a memory budget '''
+    from ensemble.base import memberFootprint
+    ens = self.ens
+    ens.member3.data = np.arange(100, dtype='float') # larger than the budget
+    assert memberFootprint(ens.member0) == 80 and memberFootprint(ens.member3) == 800
+    # arrays in slots are counted as well
+    class Slotted(DummyMember): __slots__ = ('extra','unset')
+    member = Slotted('slotted'); member.extra = np.zeros(5)
+    assert memberFootprint(member) == 120
+    res = ens.norm(order=1)
+    assert ens.norm(order=1, lparallel=True, NP=2, ens_max_memory=160) == res
+    assert ens.norm(order=1, lparallel=True, NP=2, ens_max_memory=1, ens_cost=lambda member: 1) == res
+    assert ens.norm(order=1, lparallel=True, NP=2, ens_max_memory=100, ens_reduce=np.add) == sum(ens.norm(order=1))
+    assert ens.scale(factor=2., lparallel=True, NP=2, ens_max_memory=100) == tuple(2*r for r in res)
+    assert ens.member3.data[1] == 2.
+    # arrays in containers and nested objects (e.g. the Variables of a Dataset) are counted once
+    member = DummyMember('nested'); member.variables = dict(var=DummyMember('var'), same=member.data)
+    member.axes = [np.zeros(5), member]
+    assert memberFootprint(member) == 200
+    # members without arrays can not be budgeted by footprint
+    plain = Ensemble(*[DummyMember('member{:d}'.format(i)) for i in range(4)], basetype=DummyMember)
+    for member in plain: member.data = member.data.tolist()
+    with self.assertWarns(UserWarning):
+      assert plain.norm(order=1, lparallel=True, NP=2, ens_max_memory=100) == res[:3]+(45.,)
+    ens = Ensemble(*[DummyMember('member{:d}'.format(i)) for i in range(4)], basetype=DummyMember)
+    # in reduce mode, all members of a group are in worker memory at once, so the costs of groups add up
+    import operator
+    spans = ens.span(wait=0.2, lparallel=True, NP=2, ens_max_memory=200, ens_reduce=operator.add) # groups of 160
+    assert len(spans) == 4
+    spans.sort()
+    assert all(start >= end for (_, end), (start, _) in zip(spans[:-1], spans[1:])) # one group at a time
+    spans = ens.span(wait=0.2, lparallel=True, NP=2, ens_max_memory=320, ens_reduce=operator.add)
+    assert sorted(spans)[1][0] < sorted(spans)[0][1] # both groups fit
+    # groups that exceed the budget are split
+    from ensemble.base import split_groups
+    assert split_groups([[0,1],[2,3]], {0:80, 1:80, 2:80, 3:200}, 100) == [[0],[1],[2],[3]]
+    assert split_groups([[0,1,2]], {0:50, 1:50, 2:50}, 100) == [[0,1],[2]]
+    assert ens.norm(order=1, lparallel=True, NP=2, ens_max_memory=100, ens_reduce=np.add) == sum(ens.norm(order=1))
+
+  def testOptionNames(self):
+    ''' test that wrapper options do not hide arguments of member methods '''
+    class Journaled(DummyMember):
+      def record(self, journal=None, **kwargs): return journal
+    ens = Ensemble(*[Journaled('member{:d}'.format(i)) for i in range(2)], basetype=Journaled)
+    assert ens.record() == (None, None)
+    self.assertRaises(ArgumentError, ens.record, journal='journal.jsonl')
+    # options with the prefix and options that are only accepted as arbitrary keyword arguments are not ambiguous
+    assert ens.echo(cache=1, reduce=2, cost=3, max_memory=4) == (dict(cache=1, reduce=2, cost=3, max_memory=4),)*2
+    assert ens.echo(lhash=True) == (dict(),)*2
+    # arguments of the argument expansion are passed on as well, and constraints are passed explicitly
+    assert ens.echo(shard=(0,2), constraints=[1], cost_key=2) == (dict(shard=(0,2), constraints=[1], cost_key=2),)*2
+    res = ens.echo(shard=[0,1,2], inner_list=['shard'], ens_constraints=[lambda shard: shard > 0])
+    assert res == (dict(shard=1), dict(shard=2))
+    pipeline = ens.pipeline().echo(shard=(0,2))
+    assert pipeline.run() == (dict(shard=(0,2)),)*2
+
+  def testNested(self):
+    ''' test nested parallelism with a core budget '''
+    from processing.multiprocess import CoreBudget
+    ens = self.ens
+    # without a budget, daemonic workers fall back to serial execution
+    assert ens.nested(nproc=2, lparallel=True, NP=2) == (1,)*4
+    # outer tasks hold one core each, nested calls draw free cores (never more than the budget)
+    budget = CoreBudget(ncpus=4)
+    nprocs = ens.nested(nproc=8, lparallel=True, NP=2, budget=budget)
+    assert len(nprocs) == 4 and all(1 <= n <= 4 for n in nprocs)
+    assert budget.free == 4 # all cores were returned
+    assert len(ens.nested(nproc=2, lparallel=True, NP=2, budget=True)) == 4
+    self.assertRaises(ArgumentError, ens.nested, nproc=2, budget=True) # not parallel
+
+  def testResident(self):
+    ''' test worker-resident members with sticky routing '''
+    from processing.backends import BufferPool
+    from ensemble.base import EnsembleError
+    ens = self.ens
+    with BufferPool(processes=2) as pool:
+      assert ens.norm(order=1, resident=pool, lhash=True) == ens.norm(order=1)
+      assert len(pool.residents) == 4
+      assert [worker for worker,version,start in pool.residents.values()] == [0,1,0,1] # member i goes to worker i%2
+      # members are not sent again, i.e. the same worker copies are used
+      addresses = ens.address(resident=pool, lhash=True)
+      assert ens.address(resident=pool, lhash=True) == addresses
+      # changed members are sent again
+      ens.member1.data = ens.member1.data + 1.
+      new = ens.address(resident=pool, lhash=True)
+      assert new[1] != addresses[1] and new[0] == addresses[0] and new[1][0] == addresses[1][0]
+      # modifications are not returned, so methods that modify resident members fail
+      self.assertRaises(EnsembleError, ens.count, resident=pool, lhash=True)
+      assert len(pool.residents) == 0 and all(member.ncalls == 0 for member in ens.members)
+      assert ens.norm(order=1, resident=pool, lhash=True) == ens.norm(order=1) # members are sent again
+      # members with a version counter are not hashed (methods that modify members have to increment it)
+      for member in ens: member.version = 0
+      addresses = ens.address(resident=pool)
+      assert [version for worker,version,start in pool.residents.values()] == ['version:0']*4
+      assert ens.address(resident=pool) == addresses
+      ens.member2.version += 1
+      assert ens.address(resident=pool)[2] != addresses[2]
+      # members without a version are sent with every call (modifications are lost)
+      for member in ens: del member.version
+      assert ens.count(resident=pool) == (1,1,1,1) and ens.count(resident=pool) == (1,1,1,1)
+      # members that were garbage-collected are dropped from worker memory
+      assert pool.apply_async(countResidents, worker=1).get() == 2
+      ens.removeMember('member1'); gc.collect()
+      assert len(pool.residents) == 3
+      ens.norm(order=1, resident=pool, lhash=True)
+      assert pool.apply_async(countResidents, worker=1).get() == 1
+    self.assertRaises(ArgumentError, ens.norm, resident=pool, lshared=True)
+
+  def testDedup(self):
+    ''' test deduplication of identical work units '''
+    ens = self.ens
+    ens.member1.data *= 2; ens.member3.data *= 3 # members 0 and 2 have the same content
+    for lparallel in (False,True):
+      res = ens.count(lparallel=lparallel, NP=2, ldedup=True)
+      assert res == (1,)*4 and ens.member2.ncalls == 0 # member 2 was not evaluated
+      for member in ens: member.ncalls = 0
+    # only identical arguments are merged
+    res = ens.norm(order=[1,1,2,2], inner_list=['order'], ldedup=True)
+    assert res[0] == 45. and res[1] == 90. and res[2] == np.linalg.norm(np.arange(10))
+    assert len(set(res)) == 4
+    res = ens.norm(order=[1,2,1,2], inner_list=['order'], ldedup=True)
+    assert res[0] == res[2] == 45.
+    # results are copies
+    res = ens.copy(ldedup=True)
+    assert res[0].data[1] == res[2].data[1] and res[2] is not res[0]
+    # member IDs in slots are also excluded
+    slotted = Ensemble(*[SlottedMember('member{:d}'.format(i)) for i in range(3)], basetype=SlottedMember)
+    from unittest import mock
+    import ensemble.base as base
+    assert base.find_duplicates(slotted.members, [dict()]*3, range(3)) == {1:0, 2:0}
+    with mock.patch.object(base, 'memberFingerprint', wraps=base.memberFingerprint) as fingerprint:
+      assert slotted.norm(ldedup=True) == (slotted.member0.norm(),)*3
+      assert fingerprint.call_count == 3
+      # members with different arguments are not hashed
+      ens.norm(order=[1,2,3,4], inner_list=['order'], ldedup=True)
+      assert fingerprint.call_count == 3
+      # members with a version are only hashed once per version
+      for member in ens: member.version = 1
+      ens.norm(ldedup=True); ens.norm(ldedup=True)
+      assert fingerprint.call_count == 7
+      ens.member1.version = 2; ens.norm(ldedup=True)
+      assert fingerprint.call_count == 8
+    self.assertRaises(ArgumentError, ens.norm, order=1, ens_reduce=np.add, ldedup=True)
+
+  def testBenchmark(self):
+    ''' test the benchmark harness with small problem sizes '''
+    from ensemble.benchmark import runBenchmarks
+    import io, json
+    stream = io.StringIO()
+    records = runBenchmarks(['wrapper','expand'], lquick=True, NP=2, stream=stream)
+    assert records[0]['benchmark'] == 'environment'
+    assert len(records) == 1 + 12 + 2
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == records
+    assert all(record['time'] > 0 for record in records[1:])
+
+
 if __name__ == "__main__":
 
 
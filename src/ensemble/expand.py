@@ -6,6 +6,9 @@ Random utility functions...
 @author: Andre R. Erler, GPL v3
 '''
 
+import inspect
+from processing.shard import shardIndices
+
 # named exception
 class ArgumentError(Exception):
   """Exception indicating an Error with the HGS Ensemble."""
@@ -38,6 +41,53 @@ def _loop_recursion(*args, **kwargs):
   # return results 
   return list_dict
 
+# recursion with pruning of infeasible branches
+def _pruned_recursion(loop_list, expand_dict, bound, checks, list_dict, level=0):
+  ''' same as _loop_recursion, but after the loop variable at position level is bound, the constraints in 
+      checks[level] are evaluated and branches that fail are not expanded any further; bound holds the values of 
+      static and already bound arguments '''
+  if level < len(loop_list):
+    arg_name = loop_list[level]
+    for arg in expand_dict[arg_name]:
+      bound[arg_name] = arg
+      if all(check(bound) for check in checks[level]):
+        list_dict = _pruned_recursion(loop_list, expand_dict, bound, checks, list_dict, level=level+1)
+  else:
+    # terminate recursion branch
+    for key in loop_list: list_dict[key].append(bound[key])
+  return list_dict
+
+# direct indexing of the outer product
+def _indexed_product(loop_list, expand_dict, indices):
+  ''' return the elements of the outer product of the lists in expand_dict at the given (flat) indices, without 
+      generating any other elements; the order is the same as for _loop_recursion (first argument varies slowest) '''
+  sizes = [len(expand_dict[key]) for key in loop_list]
+  list_dict = {key:list() for key in loop_list}
+  for index in indices:
+    for key,size in zip(reversed(loop_list),reversed(sizes)):
+      index, i = divmod(index, size)
+      list_dict[key].append(expand_dict[key][i])
+  return list_dict
+
+# helper function to prepare constraints
+def _constraintKeys(constraint, names):
+  ''' return the argument names that a constraint depends on (None, if it accepts arbitrary keyword arguments) '''
+  keys = []
+  for param in inspect.signature(constraint).parameters.values():
+    if param.kind == param.VAR_KEYWORD: return None
+    elif param.name in names: keys.append(param.name)
+    elif param.default is param.empty: raise ArgumentError("Unknown argument in constraint: '{}'".format(param.name))
+  return keys
+
+def _makeCheck(constraint, keys, par_names):
+  ''' return a function that evaluates a constraint for a dict of bound arguments; arguments of a parallel 
+      expansion group are extracted from the tuple of the group (par_names: name: (fake name, position)) '''
+  lookup = [(key,)+par_names.get(key, (key, None)) for key in keys]
+  def check(bound):
+    return constraint(**{key:bound[name] if pos is None else bound[name][pos] for key,name,pos in lookup})
+  return check
+
+
 # helper function to check lists
 def _prepareList(exp_list, kwargs):
   ''' helper function to clean list elements '''
@@ -51,13 +101,35 @@ def _prepareList(exp_list, kwargs):
 
 
 # helper function to form inner and outer product of multiple lists
-def expandArgumentList(inner_list=None, outer_list=None, expand_list=None, lproduct='outer', **kwargs):
+def expandArgumentList(inner_list=None, outer_list=None, expand_list=None, lproduct='outer', constraints=None, 
+                       shard=None, cost_key=None, **kwargs):
   ''' A function that generates a list of complete argument dict's, based on given kwargs and certain 
       expansion rules: kwargs listed in expand_list are expanded and distributed element-wise, 
       either as inner ('inner_list') or outer ('outer_list') product, while other kwargs are repeated 
       in every argument dict. 
       Arguments can be expanded simultaneously (in parallel) within an outer product by specifying
-      them as a tuple within the outer product argument list ('outer_list'). '''
+      them as a tuple within the outer product argument list ('outer_list'). 
+      Invalid combinations can be excluded with constraints: a list of functions that return False for invalid
+      combinations and are called with the arguments that match their parameter names (or all arguments, if they 
+      accept arbitrary keyword arguments). In a pure outer product, a constraint is evaluated as soon as all of its
+      arguments are bound, so that infeasible branches are never generated; otherwise the complete argument dicts
+      are filtered. Constraints also apply, if no arguments are expanded: if the argument dict violates a 
+      constraint, an empty list is returned.
+      If shard=(k,n) is given, only the k-th of n deterministic partitions of the argument dicts is returned (every 
+      n-th argument dict, starting at k), so that independent jobs can split a sweep; the other partitions are not
+      generated, unless the partitions are balanced with cost_key, a function that returns the (estimated) cost of 
+      an argument dict (see processing.shard.shardIndices). 
+      Arguments that have the same names as the options of this function can be expanded with expandArguments. '''
+  return expandArguments(kwargs, inner_list=inner_list, outer_list=outer_list, expand_list=expand_list, 
+                         lproduct=lproduct, constraints=constraints, shard=shard, cost_key=cost_key)
+
+def expandArguments(kwargs, inner_list=None, outer_list=None, expand_list=None, lproduct='outer', constraints=None, 
+                    shard=None, cost_key=None):
+  ''' same as expandArgumentList, but the arguments are passed as a dict ('kwargs', which is not modified), so that 
+      they can have the same names as the options (e.g. member method arguments named 'shard') '''
+  kwargs = dict(kwargs) # entries are removed during expansion
+  constraints = list(constraints or [])
+  selection = None # flat indices of the selected partition, if it was selected during expansion
   if not (expand_list or inner_list or outer_list): 
     arg_dicts = [kwargs] # return immediately - nothing to do
   else:
@@ -102,8 +174,29 @@ def expandArgumentList(inner_list=None, outer_list=None, expand_list=None, lprod
       lstlen = 1
       for el in outer_list:
         lstlen *= len(outer_dict[el])
-      # execute recursive function for outer product expansion    
-      list_dict = _loop_recursion(outer_list, **outer_dict) # use copy of
+      if constraints and len(inner_list) == 0 and len(outer_list) > 0: # N.B.: outer_list arguments can be missing
+        # evaluate constraints as soon as their arguments are bound and prune infeasible branches
+        # N.B.: constraints that depend on other arguments are applied to the complete argument dicts below
+        par_names = {name:(fake,pos) for fake,names in par_dict.items() for pos,name in enumerate(names)}
+        levels = {name:outer_list.index(par_names.get(name,(name,))[0]) for name in par_names}
+        levels.update({name:outer_list.index(name) for name in outer_list if name not in par_dict})
+        levels.update({name:-1 for name in kwtmp}) # static arguments
+        checks = [[] for el in outer_list]; remaining = []
+        for constraint in constraints:
+          keys = _constraintKeys(constraint, set(levels))
+          if keys is None or any(key not in levels for key in keys): remaining.append(constraint)
+          else: checks[max([levels[key] for key in keys]+[0])].append(_makeCheck(constraint, keys, par_names))
+        constraints = remaining
+        list_dict = _pruned_recursion(outer_list, outer_dict, dict(kwtmp), checks, {key:list() for key in outer_list})
+        lstlen = len(list_dict[outer_list[0]]) if outer_list else 1
+      elif shard is not None and cost_key is None:
+        # only generate the argument values of the selected partition
+        selection = shardIndices(lstlen, shard); ntotal = lstlen
+        list_dict = _indexed_product(outer_list, outer_dict, selection)
+        lstlen = len(selection)
+      else:
+        # execute recursive function for outer product expansion    
+        list_dict = _loop_recursion(outer_list, **outer_dict) # use copy of
       # N.B.: returns a dictionary where all kwargs have been expanded to lists of appropriate length
       assert all(key in outer_dict for key in list_dict.keys()) 
       assert all(len(list_dict[el])==lstlen for el in outer_list) # check length    
@@ -121,6 +214,12 @@ def expandArgumentList(inner_list=None, outer_list=None, expand_list=None, lprod
     if len(inner_list) > 0:
       kwtmp = kwargs.copy()
       if len(outer_list) > 0: 
+        if selection is not None:
+          # select the same partition from the inner product lists (singleton lists are broadcast below)
+          for el in inner_list:
+            if isinstance(kwtmp.get(el), (list,tuple)) and len(kwtmp[el]) != 1:
+              if len(kwtmp[el]) != ntotal: raise TypeError('Lists have to be of same length to form inner product!')
+              kwtmp[el] = [kwtmp[el][i] for i in selection]
         kwtmp.update(list_dict)
         inner_list = outer_list + inner_list
       # N.B.: this replaces all outer expansion arguments with lists of appropriate length for inner expansion
@@ -135,12 +234,26 @@ def expandArgumentList(inner_list=None, outer_list=None, expand_list=None, lprod
       list_dict = inner_dict
       
     ## generate list of argument dicts
+    if shard is not None and cost_key is None and selection is None: 
+      selection = shardIndices(lstlen, shard) # select partition before argument dicts are generated
+      indices = selection
+    else: indices = range(lstlen)
     arg_dicts = []
-    for n in range(lstlen):
+    for n in indices:
       # assemble arguments
       lstargs = {key:lst[n] for key,lst in list_dict.items()}
       arg_dict = kwargs.copy(); arg_dict.update(lstargs)
       arg_dicts.append(arg_dict)    
+  # apply remaining constraints to complete argument dicts
+  if constraints and arg_dicts:
+    names = set(arg_dicts[0])
+    checks = [_makeCheck(constraint, keys, dict()) if keys is not None else (lambda args, c=constraint: c(**args)) 
+              for constraint,keys in [(c,_constraintKeys(c, names)) for c in constraints]]
+    arg_dicts = [arg_dict for arg_dict in arg_dicts if all(check(arg_dict) for check in checks)]
+  # select partition, if this was not done during expansion
+  if shard is not None and selection is None:
+    costs = None if cost_key is None else [cost_key(arg_dict) for arg_dict in arg_dicts]
+    arg_dicts = [arg_dicts[n] for n in shardIndices(len(arg_dicts), shard, costs=costs)]
   # return list of arguments
   return arg_dicts
 
@@ -150,26 +263,29 @@ class BatchLoad(object):
   ''' A decorator class that wraps custom functions to load specific datasets. List arguments can be
       expanded to load multiple datasets and places them in a list or Ensemble. 
       Keyword arguments are passed on to the dataset load functions; arguments listed in load_list 
-      are applied to the datasets according to expansion rules, otherwise they are applied to all. '''
+      are applied to the datasets according to expansion rules, otherwise they are applied to all. 
+      Constraints and partitioning (shard and cost_key) are passed on to expandArgumentList, so that independent 
+      jobs can each load a different part of the same ensemble; they are not passed on to the load function and
+      always produce a list (or Ensemble), even if no arguments are expanded. '''
   
   def __init__(self, load_fct):
     ''' initialize wrapping of original operation '''
     self.load_fct = load_fct
     
-  def __call__(self, load_list=None, lproduct='outer', inner_list=None, outer_list=None, 
-               lensemble=None, ens_name=None, ens_title=None, **kwargs):
+  def __call__(self, load_list=None, lproduct='outer', inner_list=None, outer_list=None, constraints=None,
+               shard=None, cost_key=None, lensemble=None, ens_name=None, ens_title=None, **kwargs):
     ''' wrap original function: expand argument list, execute load_fct over argument list, 
         and return a list or Ensemble of datasets '''
     # decide, what to do
-    if load_list is None and inner_list is None and outer_list is None:
+    if load_list is None and inner_list is None and outer_list is None and constraints is None and shard is None:
       # normal operation: no expansion      
       datasets =  self.load_fct(**kwargs)
     else:
       # expansion required
       lensemble = ens_name is not None if lensemble is None else lensemble
       # figure out arguments
-      kwargs_list = expandArgumentList(expand_list=load_list, lproduct=lproduct, 
-                                       inner_list=inner_list, outer_list=outer_list, **kwargs)
+      kwargs_list = expandArguments(kwargs, expand_list=load_list, lproduct=lproduct, inner_list=inner_list, 
+                                    outer_list=outer_list, constraints=constraints, shard=shard, cost_key=cost_key)
       # load datasets
       datasets = []
       for kwargs in kwargs_list:    
@@ -0,0 +1,109 @@
+"""Created on 2026-10-18
+
+Incremental evaluation of ensemble results: per-member results and aggregate accumulators are only updated for
+members that are added to or removed from an Ensemble.
+
+@author: Andre R. Erler, GPL v3
+"""
+
+
+# external imports
+import numpy as np
+import collections
+
+
+class IncrementalResult(object):
+    """A class that holds the results of a member method call for all members of an ensemble, together with aggregate
+    accumulators (count, sum, mean, minimum and maximum); the Ensemble updates the results when members are added or
+    removed, so that only added members have to be evaluated.
+
+    Instances are created with Ensemble.track(); results are keyed by member ID. Removing a member does not require any
+    member evaluations: the sum is downdated and the extrema are recomputed from the cached results, if necessary.
+    """
+
+    def __init__(self, ensemble, attr, **kwargs):
+        """Initialize with the ensemble, the method name 'attr' and keyword arguments for the method, and evaluate all
+        current members.
+        """
+        self.ensemble = ensemble
+        self.attr = attr
+        self.kwargs = kwargs
+        self.results = collections.OrderedDict() # member ID: result
+        self.count = 0
+        self.sum = None
+        self.min = None
+        self.max = None
+        self.nevals = 0 # number of member evaluations
+
+        for member in ensemble.members:
+            self.add(member)
+
+    def _memid(self, member):
+        """Return the ID of a member (or the ID itself)."""
+        return member if isinstance(member, str) else getattr(member, self.ensemble.idkey)
+
+    def add(self, member):
+        """Evaluate a new member and update the accumulators."""
+        memid = self._memid(member)
+
+        if memid in self.results:
+            self.remove(memid) # replace existing result
+        result = getattr(member, self.attr)(**self.kwargs)
+        self.nevals += 1
+        self.results[memid] = result
+        self.count += 1
+
+        if self.count == 1:
+            self.sum = result
+            self.min = result
+            self.max = result
+
+        else:
+            self.sum = self.sum + result
+            self.min = np.minimum(self.min, result)
+            self.max = np.maximum(self.max, result)
+
+    def remove(self, member):
+        """Remove the result of a member and update the accumulators."""
+        result = self.results.pop(self._memid(member))
+        self.count -= 1
+
+        if self.count == 0:
+            self.sum = self.min = self.max = None
+
+        else:
+            self.sum = self.sum - result # N.B.: floating point round-off can accumulate
+            # extrema cannot be downdated, but can be recomputed from the cached results
+
+            if np.any(np.equal(result, self.min)):
+                self.min = self._reduce(np.minimum)
+
+            if np.any(np.equal(result, self.max)):
+                self.max = self._reduce(np.maximum)
+
+    def _reduce(self, ufunc):
+        """Reduce the cached results with a binary function."""
+        results = iter(self.results.values())
+        value = next(results)
+
+        for result in results:
+            value = ufunc(value, result)
+        return value
+
+    @property
+    def mean(self):
+        """Ensemble mean of the results."""
+        return None if self.count == 0 else self.sum / self.count
+
+    @property
+    def values(self):
+        """Tuple of results, in the order of the ensemble members."""
+        return tuple(self.results[self._memid(member)] for member in self.ensemble.members)
+
+    def __getitem__(self, member):
+        """Result for a member (or member ID)."""
+        return self.results[self._memid(member)]
+
+    def __len__(self):
+        """Number of results."""
+        return len(self.results)
@@ -0,0 +1,338 @@
+'''
+Created on 2026-10-18
+
+Pluggable execution backends for Ensemble, asyncPoolEC and apply_along_axis.
+
+An execution backend is any object that implements the apply_async method of multiprocessing.Pool, i.e.
+apply_async(func, args=(), kwds=None, callback=None, error_callback=None), and returns an object with a get method
+(like an AsyncResult); a multiprocessing.Pool is therefore also a valid (local) backend.
+The ClusterBackend sends tasks to remote worker processes through a manager server over TCP sockets; workers can
+run on the same machine (nworkers > 0) or on other nodes (see runWorker), so that the same API scales from a laptop
+to a cluster.
+The BufferPool is a local worker pool that sends tasks and results through pipes, using pickle protocol 5 with
+out-of-band buffers (see processing.serialize), so that large arrays are not copied into the pickle stream.
+
+@author: Andre R. Erler, GPL v3
+'''
+
+import os
+import sys
+import time
+import queue
+import socket
+import pickle
+import threading
+import itertools
+import collections
+import multiprocessing
+from multiprocessing.managers import BaseManager
+from multiprocessing.connection import wait
+# internal imports
+from processing.serialize import sendObject, recvObject
+from processing.multiprocess import getNP
+
+
+# result object for tasks that are executed by a ClusterBackend
+class ClusterResult():
+  ''' A minimal implementation of the AsyncResult interface for tasks that run on remote workers. '''
+
+  def __init__(self, callback=None, error_callback=None):
+    ''' initialize empty result '''
+    self._event = threading.Event()
+    self._success = None
+    self._value = None
+    self._callback = callback
+    self._error_callback = error_callback
+
+  def _set(self, success, value):
+    ''' store result (or exception) and call callback functions (called by the collector thread) '''
+    self._success = success; self._value = value
+    if success and self._callback is not None: self._callback(value)
+    elif not success and self._error_callback is not None: self._error_callback(value)
+    self._event.set()
+
+  def ready(self): return self._event.is_set()
+
+  def successful(self):
+    if not self.ready(): raise ValueError('Result is not ready.')
+    return self._success
+
+  def wait(self, timeout=None): self._event.wait(timeout)
+
+  def get(self, timeout=None):
+    ''' return result or raise the exception that occurred in the worker '''
+    if not self._event.wait(timeout): raise multiprocessing.TimeoutError
+    if self._success: return self._value
+    else: raise self._value
+
+
+# manager classes that provide access to the task and result queues over sockets
+class _QueueManager(BaseManager): pass
+
+_server_queues = collections.defaultdict(queue.Queue) # task and result queues (only used in the server process)
+def _getTasks(): return _server_queues['tasks']
+def _getResults(): return _server_queues['results']
+
+class _ServerManager(BaseManager): pass
+_ServerManager.register('get_tasks', callable=_getTasks)
+_ServerManager.register('get_results', callable=_getResults)
+
+
+# worker loop for remote (or local) worker processes
+def runWorker(address, authkey, heartbeat=None):
+  ''' connect to a ClusterBackend server at address (host, port) and execute tasks until None is received; this
+      function can be started on any node that can reach the server (and import the task functions); if heartbeat
+      is not None, a sign of life is sent every heartbeat seconds '''
+  _QueueManager.register('get_tasks'); _QueueManager.register('get_results')
+  manager = _QueueManager(address=tuple(address), authkey=authkey)
+  manager.connect()
+  tasks = manager.get_tasks(); results = manager.get_results()
+  wid = '{:s}:{:d}'.format(socket.gethostname(), os.getpid()) # worker ID
+  if heartbeat is not None:
+    def beat():
+      try:
+        while True:
+          results.put(('alive', wid, None)); time.sleep(heartbeat)
+      except (OSError, EOFError): pass # server has shut down
+    threading.Thread(target=beat, daemon=True).start()
+  while True:
+    task = tasks.get()
+    if task is None: break
+    n, func, args, kwargs = task
+    results.put(('start', wid, n))
+    try:
+      value = (True, func(*args, **kwargs))
+      pickle.dumps(value) # make sure the result can be sent back
+    except Exception as err:
+      value = (False, err)
+    results.put(('done', wid, (n,)+value))
+
+
+class ClusterBackend(object):
+  '''
+    An execution backend that sends tasks to worker processes through a manager server (TCP sockets); the server
+    runs in a separate process. Workers can be started on the local machine (nworkers > 0), which is useful for
+    testing, or on other nodes, using runWorker (or 'python backends.py host port authkey [heartbeat]').
+    Workers send a sign of life every heartbeat seconds; if a worker is silent for three intervals, it is considered
+    dead and the task it was running fails with a RuntimeError (remote workers have to use the same heartbeat).
+  '''
+
+  def __init__(self, nworkers=0, address=('localhost',0), authkey=None, heartbeat=5.):
+    ''' start manager server and local worker processes; address=('',port) accepts connections from other nodes '''
+    self.authkey = authkey or os.urandom(16) # random key, unless workers on other nodes have to connect
+    self.heartbeat = heartbeat # None: no liveness checks
+    self._pending = dict() # task ID: ClusterResult
+    self._counter = itertools.count()
+    self._lock = threading.Lock()
+    # start manager server in its own process
+    self._manager = _ServerManager(address=address, authkey=self.authkey)
+    self._manager.start()
+    self.address = self._manager.address
+    self._tasks = self._manager.get_tasks(); self._results = self._manager.get_results()
+    # start thread that collects results
+    self._collector = threading.Thread(target=self._collect, daemon=True)
+    self._collector.start()
+    # start local workers
+    self.workers = []
+    for i in range(nworkers):
+      worker = multiprocessing.Process(target=runWorker, args=(self.address, self.authkey, heartbeat),
+                                       name='ClusterWorker-{:d}'.format(i+1), daemon=True)
+      worker.start()
+      self.workers.append(worker)
+
+  def _collect(self):
+    ''' collect results from the result queue and pass them to the corresponding result objects; tasks of workers
+        that stopped sending signs of life fail '''
+    running = dict() # worker ID: task ID
+    seen = dict() # worker ID: time of last message
+    while True:
+      try:
+        item = self._results.get(timeout=self.heartbeat)
+      except queue.Empty:
+        item = ('alive', None, None) # only check liveness
+      if item is None: break
+      kind, wid, value = item
+      if wid is not None: seen[wid] = time.time()
+      if kind == 'start': running[wid] = value
+      elif kind == 'done':
+        n, success, value = value
+        running.pop(wid, None)
+        with self._lock: result = self._pending.pop(n, None)
+        if result is not None: result._set(success, value) # None, if the worker was considered dead
+      if self.heartbeat is not None:
+        for wid in [wid for wid in running if time.time() - seen[wid] > 3*self.heartbeat]:
+          n = running.pop(wid); del seen[wid]
+          with self._lock: result = self._pending.pop(n, None)
+          if result is not None:
+            result._set(False, RuntimeError("Worker '{}' died while running task {}.".format(wid, n)))
+
+  def apply_async(self, func, args=(), kwds=None, callback=None, error_callback=None):
+    ''' submit a task to the workers and return a ClusterResult '''
+    n = next(self._counter)
+    result = ClusterResult(callback=callback, error_callback=error_callback)
+    with self._lock: self._pending[n] = result
+    self._tasks.put((n, func, tuple(args), kwds or dict()))
+    return result
+
+  def close(self):
+    ''' tell local workers to exit, after all tasks are done '''
+    for worker in self.workers: self._tasks.put(None)
+
+  def join(self):
+    ''' wait for local workers to exit '''
+    for worker in self.workers: worker.join()
+
+  def shutdown(self, nremote=0):
+    ''' stop local workers, nremote remote workers, the collector thread and the server '''
+    for n in range(nremote): self._tasks.put(None)
+    self.close(); self.join()
+    self._results.put(None); self._collector.join()
+    self._manager.shutdown()
+
+  def __enter__(self): return self
+
+  def __exit__(self, *args): self.shutdown()
+
+
+# worker loop for BufferPool worker processes
+def _bufferWorker(conn, initializer=None, initargs=()):
+  ''' receive tasks through a pipe and send back results; arguments and results are sent with out-of-band buffers '''
+  if initializer is not None: initializer(*initargs)
+  while True:
+    task = recvObject(conn)
+    if task is None: break
+    func, args, kwargs = task
+    try:
+      value = (True, func(*args, **kwargs))
+    except Exception as err:
+      value = (False, err)
+    try: sendObject(conn, value)
+    except Exception as err: sendObject(conn, (False, err)) # result could not be pickled
+  conn.close()
+
+
+class BufferPool(object):
+  '''
+    A local worker pool that implements the apply_async, close and join methods of multiprocessing.Pool, but sends
+    tasks and results through pipes using pickle protocol 5 with out-of-band buffers, so that array data is sent
+    directly from memory, instead of being copied into the pickle stream; it can be used as an execution backend or
+    as the pool argument of apply_along_axis. Tasks are dispatched to idle workers by a thread.
+    Workers are persistent and numbered, and tasks can be routed to a specific worker (worker affinity), e.g. so that
+    objects which are kept in worker memory between tasks are reused; 'starts' counts how often each worker was 
+    started (a replaced worker has lost its memory), and 'residents' can be used by clients to keep track of 
+    worker-resident objects (e.g. EnsembleWrapper with the 'resident' option).
+  '''
+
+  def __init__(self, processes=None, initializer=None, initargs=()):
+    ''' start worker processes and the dispatcher thread '''
+    self._tasks = collections.deque()
+    self._pending = dict() # task ID: ClusterResult
+    self._counter = itertools.count()
+    self._lock = threading.Lock()
+    self._closed = False
+    self._wakeup, self._notify = multiprocessing.Pipe(duplex=False) # to wake up the dispatcher
+    self._initializer = initializer; self._initargs = initargs
+    self._names = itertools.count(1)
+    self.workers = dict() # pipe connection: process
+    self._idle = []; self._busy = dict() # pipe connection: task ID
+    NP = getNP(processes)
+    self._conns = [None]*NP; self._index = dict() # worker index: pipe connection, and reverse
+    self._queues = [collections.deque() for i in range(NP)] # tasks for specific workers
+    self.starts = [0]*NP # number of times each worker was started
+    self.residents = dict() # records of worker-resident objects (maintained by clients)
+    for i in range(NP): self._startWorker(i)
+    self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+    self._dispatcher.start()
+
+  def __len__(self):
+    ''' number of worker processes '''
+    return len(self._conns)
+
+  def _startWorker(self, index):
+    ''' start a new worker process with the given index and add it to the idle workers '''
+    conn, child = multiprocessing.Pipe()
+    worker = multiprocessing.Process(target=_bufferWorker, args=(child, self._initializer, self._initargs),
+                                     name='BufferWorker-{:d}'.format(next(self._names)), daemon=True)
+    worker.start(); child.close()
+    self.workers[conn] = worker; self._idle.append(conn)
+    self._conns[index] = conn; self._index[conn] = index; self.starts[index] += 1
+
+  def _dispatch(self):
+    ''' send tasks to idle workers and pass results to the corresponding result objects '''
+    while True:
+      sends = []
+      with self._lock:
+        for conn in self._idle[::-1]:
+          queue = self._queues[self._index[conn]] or self._tasks # tasks for this worker first
+          if not queue: continue
+          n, task = queue.popleft()
+          self._idle.remove(conn); self._busy[conn] = n
+          sends.append((conn, queue, n, task))
+        if self._closed and not self._tasks and not any(self._queues) and not self._busy: break
+      # send tasks without holding the lock, since large messages can take a while
+      lretry = False
+      for conn, queue, n, task in sends:
+        try: 
+          sendObject(conn, task)
+        except (OSError, EOFError): # worker died while idle: replace it and requeue the task
+          with self._lock:
+            del self._busy[conn]; queue.appendleft((n, task))
+            self.workers.pop(conn).join(); conn.close()
+            self._startWorker(self._index.pop(conn))
+          lretry = True
+      sends = task = None # don't hold on to task arguments (e.g. large arrays) while waiting
+      if lretry: continue # dispatch requeued tasks to the new workers
+      with self._lock: busy = list(self._busy)
+      for conn in wait(busy + [self._wakeup]):
+        if conn is self._wakeup: 
+          conn.recv_bytes(); continue
+        try: 
+          success, value = recvObject(conn); ldead = False
+        except (EOFError, OSError): 
+          success, value = False, EOFError('Worker died.'); ldead = True
+        with self._lock:
+          result = self._pending.pop(self._busy.pop(conn))
+          if ldead: # replace worker
+            self.workers.pop(conn).join(); conn.close()
+            self._startWorker(self._index.pop(conn))
+          else: self._idle.append(conn)
+        result._set(success, value)
+    # tell workers to exit
+    for conn in self.workers:
+      try: sendObject(conn, None)
+      except (OSError, EOFError): pass # worker is already dead
+
+  def apply_async(self, func, args=(), kwds=None, callback=None, error_callback=None, worker=None):
+    ''' submit a task to the workers and return a ClusterResult; if worker is not None, the task is executed by the
+        worker with that index (modulo the number of workers), otherwise by the next idle worker '''
+    if self._closed: raise ValueError('Pool is closed.')
+    n = next(self._counter)
+    result = ClusterResult(callback=callback, error_callback=error_callback)
+    with self._lock:
+      self._pending[n] = result
+      queue = self._tasks if worker is None else self._queues[worker%len(self._queues)]
+      queue.append((n, (func, tuple(args), kwds or dict())))
+    self._notify.send_bytes(b'')
+    return result
+
+  def close(self):
+    ''' stop accepting tasks; workers exit after all tasks are done '''
+    self._closed = True
+    self._notify.send_bytes(b'')
+
+  def join(self):
+    ''' wait for all tasks to finish and workers to exit '''
+    self._dispatcher.join()
+    for worker in self.workers.values(): worker.join()
+
+  def __enter__(self): return self
+
+  def __exit__(self, *args): self.close(); self.join()
+
+
+if __name__ == '__main__':
+
+  # start a worker on this node: python backends.py host port authkey [heartbeat]
+  host, port, authkey = sys.argv[1:4]
+  heartbeat = float(sys.argv[4]) if len(sys.argv) > 4 else 5.
+  runWorker((host, int(port)), authkey.encode(), heartbeat=heartbeat)
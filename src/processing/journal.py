@@ -0,0 +1,87 @@
+'''
+Created on 2026-10-18
+
+A simple on-disk journal that records completed tasks, so that long batch runs can be resumed after a crash.
+
+@author: Andre R. Erler, GPL v3
+'''
+
+import os
+import json
+import pickle
+import base64
+import hashlib
+import numpy as np
+
+
+# compute a stable key for a task
+def _stableValue(obj):
+  ''' JSON representation of NumPy scalars and arrays (arrays are represented by a hash of their content); other
+      objects are rejected, since their representation (e.g. memory addresses) is not stable between runs '''
+  if isinstance(obj, np.generic): return obj.item()
+  elif isinstance(obj, np.ndarray): 
+    array = np.ascontiguousarray(obj)
+    return dict(dtype=str(array.dtype), shape=array.shape, sha1=hashlib.sha1(array.tobytes()).hexdigest())
+  else: raise TypeError("Task arguments of type '{}' do not have a stable key.".format(type(obj).__name__))
+
+def taskKey(*args, **kwargs):
+  ''' return a hash of the task arguments that is stable between runs; arguments are serialized as JSON, so that 
+      only strings, numbers, booleans, None, lists, tuples and dicts of those, as well as NumPy scalars and arrays 
+      are supported; a TypeError is raised for other objects '''
+  string = json.dumps([args, kwargs], sort_keys=True, default=_stableValue)
+  return hashlib.sha1(string.encode('utf-8')).hexdigest()
+
+
+class TaskJournal(object):
+  '''
+    An append-only journal (one JSON record per line) that records completed tasks, keyed by a hash of their
+    arguments (see taskKey), together with their exit codes and/or (pickled) results.
+    When a run is restarted with the same journal file, tasks that are already recorded can be skipped.
+  '''
+
+  def __init__(self, filename):
+    ''' open journal file and load existing records '''
+    self.filename = filename
+    self.records = dict()
+    if os.path.exists(filename):
+      with open(filename, 'r') as f:
+        for line in f:
+          try: record = json.loads(line)
+          except ValueError: continue # incomplete last line after a crash
+          self.records[record['key']] = record
+
+  def __contains__(self, key):
+    ''' check if a task has been recorded '''
+    return key in self.records
+
+  def __len__(self):
+    ''' number of recorded tasks '''
+    return len(self.records)
+
+  def exitcode(self, key):
+    ''' return the recorded exit code of a task (None, if the task was not recorded) '''
+    record = self.records.get(key)
+    return None if record is None else record.get('ec')
+
+  def result(self, key):
+    ''' return the recorded result of a task (the result is unpickled) '''
+    return pickle.loads(base64.b64decode(self.records[key]['result']))
+
+  def record(self, key, ec=None, **kwargs):
+    ''' append a completed task to the journal; an optional result can be passed as a keyword argument and is
+        pickled; the file is flushed immediately, so that records survive a crash '''
+    record = dict(key=key, ec=ec)
+    if 'result' in kwargs:
+      record['result'] = base64.b64encode(pickle.dumps(kwargs['result'])).decode('ascii')
+    with open(self.filename, 'a') as f:
+      f.write(json.dumps(record)+'\n')
+      f.flush(); os.fsync(f.fileno())
+    self.records[key] = record
+
+
+# helper function to open a journal
+def openJournal(journal):
+  ''' return a TaskJournal instance; journal can be a file name, a TaskJournal instance, or None '''
+  if journal is None or isinstance(journal, TaskJournal): return journal
+  elif isinstance(journal, str): return TaskJournal(journal)
+  else: raise TypeError(journal)
@@ -0,0 +1,428 @@
+'''
+Created on 2015-01-19 
+
+Unittest for assorted PyGeoDat components not included elsewhere.
+
+@author: Andre R. Erler, GPL v3
+'''
+
+import unittest
+import numpy as np
+import os, sys, gc
+import shutil
+import multiprocessing
+import logging
+from time import sleep
+
+
+# import geodata modules
+from utils.nctools import writeNetCDF
+from geodata.misc import isZero, isOne, isEqual
+from geodata.base import Variable, Axis, Dataset, Ensemble
+from datasets.common import data_root
+# import modules to be tested
+
+
+# RAM disk settings ("global" variable)
+RAM = True # whether or not to use a RAM disk
+ramdisk = '/media/tmp/' # folder where RAM disk is mounted
+NP = 2
+ldebug = False
+
+
+# start a child process (e.g. from a worker of a nestedPool) and return its process ID
+_children = []
+def startChild(seconds=60):
+  child = multiprocessing.Process(target=sleep, args=(seconds,), daemon=True)
+  child.start(); _children.append(child)
+  return child.pid
+
+
+## tests for multiprocess module
+class MultiProcessTest(unittest.TestCase):  
+   
+  def setUp(self):
+    ''' create two test variables '''
+    pass
+      
+  def tearDown(self):
+    ''' clean up '''
+    gc.collect()
+
+  def testApplyAlongAxis(self):
+    ''' test parallelized version of Numpy's apply_along_axis '''    
+    from processing.multiprocess import apply_along_axis, test_aax, test_noaax
+    import functools
+    
+    def run_test(fct, kw=0, axis=1, laax=True, lcopy=True):
+      ff = functools.partial(fct, kw=kw)
+      shape = (500,100)
+      data = np.arange(np.prod(shape), dtype='float').reshape(shape)
+      assert data.shape == shape
+      # parallel implementation using my wrapper
+      pres = apply_along_axis(ff, axis, data, NP=2, ldebug=True, laax=laax, lcopy=lcopy)
+      print(pres.shape)
+      assert pres.shape == data.shape
+      assert isZero(pres.mean(axis=axis)+kw) and isZero(pres.std(axis=axis)-1.)
+      # straight-forward numpy version
+      res = np.apply_along_axis(ff, axis, data)
+      assert res.shape == data.shape
+      assert isZero(res.mean(axis=axis)+kw) and isZero(res.std(axis=axis)-1.)
+      # final test
+      assert isEqual(pres, res) 
+      
+    # run tests 
+    run_test(test_noaax, kw=1, laax=False) # without Numpy's apply_along_axis
+    run_test(test_aax, kw=1, laax=True) # Numpy's apply_along_axis
+    run_test(test_noaax, kw=1, axis=0, laax=False, lcopy=False) # memory-lean mode with strided tiles
+    run_test(test_aax, kw=1, axis=0, laax=True, lcopy=False) # memory-lean mode with strided tiles
+
+  def testApplyAlongAxisTiles(self):
+    ''' test parallel apply_along_axis with multi-dimensional tiles (3D input, sample axis in the middle) '''    
+    from processing.multiprocess import apply_along_axis
+    data = np.arange(20*30*40, dtype='float').reshape((20,30,40))
+    res = data.mean(axis=1)
+    for lcopy in (True,False):
+      pres = apply_along_axis(np.mean, 1, data, NP=NP, chunksize=70, ldebug=ldebug, lcopy=lcopy)
+      assert pres.shape == res.shape and isEqual(pres, res)
+      pres = apply_along_axis(np.sort, 1, data[:,::-1,:], NP=NP, chunksize=70, lcopy=lcopy)
+      assert pres.shape == data.shape and isEqual(pres, data)
+    # the output type is promoted, if later chunks return a wider type
+    from processing.multiprocess import test_aax_mixed
+    mixed = np.arange(500*20, dtype='float').reshape((500,20)); mixed[280:] += 0.5 # from the fifth chunk on
+    for lcopy in (True,False):
+      pres = apply_along_axis(test_aax_mixed, 1, mixed, NP=NP, chunksize=70, lcopy=lcopy)
+      assert pres.dtype == np.float64 and np.all(pres == mixed.max(axis=1))
+    pres = apply_along_axis(test_aax_mixed, 1, mixed, NP=1, chunksize=70, lcopy=False) # lazy serial tiles
+    assert pres.dtype == np.float64 and np.all(pres == mixed.max(axis=1))
+    # errors in workers are raised and the pool is shut down
+    self.assertRaises(np.linalg.LinAlgError, apply_along_axis, np.linalg.inv, 1, data, NP=NP, chunksize=70)
+
+  def testApplyAlongAxisMultiOutput(self):
+    ''' test parallel apply_along_axis with functions that return multiple outputs '''    
+    from processing.multiprocess import apply_along_axis, test_aax_helper, test_aax
+    import functools
+    ff = functools.partial(test_aax_helper, kw=1)
+    shape = (500,100)
+    data = np.arange(np.prod(shape), dtype='float').reshape(shape)
+    for lcopy in (True,False):
+      pres, pkw = apply_along_axis(ff, 0, data, NP=2, ldebug=ldebug, lcopy=lcopy, nout=2)
+      assert pres.shape == data.shape and pkw.shape == shape[1:]
+      assert isEqual(pres, np.apply_along_axis(functools.partial(test_aax, kw=1), 0, data))
+      assert np.all(pkw == 1)
+
+  def testApplyAlongAxisCompact(self):
+    ''' test parallel apply_along_axis with compaction of masked and NaN samples '''    
+    from processing.multiprocess import apply_along_axis, test_aax_helper
+    import functools
+    data = np.arange(50000, dtype='float').reshape((500,100))
+    data[:,::3] = np.nan; data[5,7] = np.nan # all-NaN samples and a partially valid sample
+    valid = ~np.all(np.isnan(data), axis=0)
+    pres = apply_along_axis(np.nanmean, 0, data, NP=NP, chunksize=10, ldebug=ldebug, lcompact=True)
+    assert pres.shape == (100,) and np.all(np.isnan(pres) == ~valid)
+    assert isEqual(pres[valid], np.nanmean(data[:,valid], axis=0))
+    # masked arrays, fill values and multiple outputs
+    mdata = np.ma.masked_invalid(data)
+    pres, pkw = apply_along_axis(functools.partial(test_aax_helper, kw=1), 0, mdata, NP=NP, chunksize=10, 
+                                 lcompact=True, fill_value=-1, nout=2)
+    assert pres.shape == data.shape and pkw.shape == (100,)
+    assert np.all(pres[:,~valid] == -1) and np.all(pkw[valid] == 1) and np.all(pkw[~valid] == -1)
+    # samples are gathered from a view along any axis
+    data3 = np.stack([data, data[::-1]], axis=2) # shape (500,100,2), all-NaN samples along axis 0
+    pres = apply_along_axis(np.sort, 0, data3, NP=NP, chunksize=10, lcompact=True)
+    assert pres.shape == data3.shape and np.all(np.isnan(pres[:,~valid,:]))
+    assert np.array_equal(pres[:,valid,:], np.sort(data3[:,valid,:], axis=0), equal_nan=True)
+    # the result type is only promoted, if fill values are inserted
+    idata = np.arange(50000).reshape((500,100))
+    pres = apply_along_axis(np.argmax, 0, idata, NP=NP, chunksize=10, lcompact=True)
+    assert np.issubdtype(pres.dtype, np.integer) and np.all(pres == 499)
+    assert apply_along_axis(np.argmax, 0, data, NP=NP, chunksize=10, lcompact=True).dtype == np.float64
+    # if all samples are invalid, the shape of the results is determined from an invalid sample
+    nans = np.full((50,10), np.nan)
+    pres = apply_along_axis(np.nanmean, 1, nans, NP=NP, lcompact=True)
+    assert pres.shape == (50,) and np.all(np.isnan(pres))
+    pres = apply_along_axis(np.sort, 1, nans, NP=NP, lcompact=True, fill_value=-1)
+    assert pres.shape == (50,10) and np.all(pres == -1)
+    self.assertRaises(ValueError, apply_along_axis, np.linalg.cholesky, 1, nans, lcompact=True)
+    self.assertRaises(NotImplementedError, apply_along_axis, np.mean, 0, data, lcompact=True, outfile='mean.npy')
+
+  def testApplyAlongAxisMemmap(self):
+    ''' test parallel apply_along_axis with memory-mapped input and output arrays '''    
+    from processing.multiprocess import apply_along_axis
+    import tempfile
+    folder = tempfile.mkdtemp()
+    data = np.arange(50000, dtype='float').reshape((500,100))
+    np.save(os.path.join(folder,'data.npy'), data)
+    data.tofile(os.path.join(folder,'data.bin'))
+    res = data.mean(axis=0)
+    # input from .npy file or raw binary file, output to memory map
+    pres = apply_along_axis(np.mean, 0, os.path.join(folder,'data.npy'), NP=NP, chunksize=20,
+                            outfile=os.path.join(folder,'mean.npy'))
+    assert isinstance(pres, np.memmap) and isEqual(pres, res)
+    assert isEqual(np.load(os.path.join(folder,'mean.npy')), res)
+    # the output file is replaced, if the type of the results is promoted
+    from processing.multiprocess import test_aax_mixed
+    mixed = data.copy(); mixed[:,60:] += 0.5
+    pres = apply_along_axis(test_aax_mixed, 0, mixed, NP=NP, chunksize=20, outfile=os.path.join(folder,'max.npy'))
+    assert pres.dtype == np.float64 and np.all(np.load(os.path.join(folder,'max.npy')) == mixed.max(axis=0))
+    assert not os.path.exists(os.path.join(folder,'max.npy.tmp'))
+    pres = apply_along_axis(np.mean, 0, os.path.join(folder,'data.bin'), NP=NP, chunksize=20,
+                            mm_dtype=data.dtype, mm_shape=data.shape)
+    assert isEqual(pres, res)
+    # views of memory maps
+    mm = np.load(os.path.join(folder,'data.npy'), mmap_mode='r')
+    assert isEqual(apply_along_axis(np.mean, 1, mm[10:], NP=NP, chunksize=20), data[10:].mean(axis=1))
+    assert isEqual(apply_along_axis(np.mean, 1, mm[10:40][5:], NP=NP, chunksize=20), data[15:40].mean(axis=1))
+    # copies and results of operations are not backed by the file
+    assert isEqual(apply_along_axis(np.mean, 1, mm.copy(), NP=NP, chunksize=20), data.mean(axis=1))
+    assert isEqual(apply_along_axis(np.mean, 1, mm*2., NP=NP, chunksize=20), 2*data.mean(axis=1))
+    # keyword arguments like dtype are still passed on to fct
+    pres = apply_along_axis(np.mean, 1, data, NP=NP, chunksize=20, laax=False, dtype='float32')
+    assert pres.dtype == np.float32 and isEqual(pres, data.mean(axis=1))
+    shutil.rmtree(folder)
+
+  def testApplyAlongAxisPool(self):
+    ''' test reuse of persistent and external worker pools in apply_along_axis '''    
+    from processing.multiprocess import apply_along_axis, getNP, getPool, closePool
+    assert getNP() > 0 and getNP(3) == 3
+    data = np.arange(50000, dtype='float').reshape((500,100))
+    res = data.mean(axis=1)
+    for n in range(3): # consecutive calls reuse the same pool
+      assert isEqual(apply_along_axis(np.mean, 1, data, NP=NP, pool=True), res)
+    assert getPool(NP) is getPool(NP)
+    closePool()
+    pool = multiprocessing.Pool(processes=NP)
+    assert isEqual(apply_along_axis(np.mean, 1, data, NP=NP, pool=pool), res)
+    assert isEqual(apply_along_axis(np.mean, 1, data, NP=NP, pool=pool), res) # pool is not closed
+    pool.close(); pool.join()
+
+  def testThreadLimits(self):
+    ''' test splitting of cores and limits for native threads in workers '''    
+    from processing.multiprocess import splitCores, limitThreads, getPool, closePool
+    assert splitCores(NP=4, ncpus=64) == (4,16)
+    assert splitCores(nthreads=8, ncpus=64) == (8,8)
+    assert splitCores(ncpus=64) == (64,1)
+    pool = getPool(NP=NP, nthreads=2)
+    env = pool.apply_async(os.getenv, ('OPENBLAS_NUM_THREADS',)).get()
+    assert env == '2'
+    closePool()
+
+  
+  def testAsyncPool(self):
+    ''' test asyncPool wrapper '''    
+    from processing.multiprocess import asyncPoolEC, test_func_dec, test_func_ec
+    args = [(n,) for n in range(5)]
+    kwargs = dict(wait=1)
+    ec = asyncPoolEC(test_func_dec, args, kwargs, NP=NP, ldebug=ldebug, ltrialnerror=True)
+    assert ec == 0 
+    ec = asyncPoolEC(test_func_ec, args, kwargs, NP=NP, ldebug=ldebug, ltrialnerror=True)
+    assert ec == 4
+    ec = asyncPoolEC(test_func_ec, args, kwargs, NP=NP, ldebug=ldebug, ltrialnerror=False)
+    assert ec == 5 # N.B.: without TrialNError, logger is a string and all tasks raise exceptions (counted as failures)
+    ec = asyncPoolEC(test_func_dec, args, kwargs, NP=NP, ldebug=ldebug, ltrialnerror=True, nthreads=1)
+    assert ec == 0
+    
+  def testAsyncPoolJournal(self):
+    ''' test resuming asyncPool runs from a journal '''    
+    from processing.multiprocess import asyncPoolEC, test_func_ec
+    from processing.journal import TaskJournal
+    import tempfile
+    folder = tempfile.mkdtemp()
+    journal = TaskJournal(os.path.join(folder,'journal.jsonl'))
+    args = [(n,) for n in range(5)]; kwargs = dict(wait=1)
+    ec = asyncPoolEC(test_func_ec, args, kwargs, NP=NP, ldebug=ldebug, journal=journal)
+    assert ec == 4 and len(journal) == 5
+    assert kwargs == dict(wait=1) # the caller's keyword arguments are not modified
+    # the successful task is skipped, failed tasks are repeated
+    ec = asyncPoolEC(test_func_ec, args, kwargs, NP=NP, ldebug=ldebug, journal=journal.filename)
+    assert ec == 4 and len(TaskJournal(journal.filename)) == 5
+    shutil.rmtree(folder)
+    
+  def testTaskKey(self):
+    ''' test stable task keys '''    
+    from processing.journal import taskKey
+    key = taskKey('func', (1, 'a', None), x=[1.5, True], y=dict(z=2))
+    assert key == taskKey('func', (1, 'a', None), y=dict(z=2), x=[1.5, True])
+    assert key != taskKey('func', (1, 'a', None), x=[1.5, False], y=dict(z=2))
+    # NumPy scalars are converted, arrays are represented by their content
+    assert taskKey(np.float64(1.5), n=np.int32(2)) == taskKey(1.5, n=2)
+    assert taskKey(np.arange(4)) == taskKey(np.arange(4)) != taskKey(np.arange(4).reshape((2,2)))
+    # objects without a stable representation are rejected
+    self.assertRaises(TypeError, taskKey, np.mean)
+    self.assertRaises(TypeError, taskKey, x=object())
+    
+  def testAsyncPoolShard(self):
+    ''' test deterministic partitioning of asyncPool tasks '''    
+    from processing.multiprocess import asyncPoolEC, shardIndices, test_func_ec
+    assert shardIndices(5, (0,2)) == [0,2,4] and shardIndices(5, (1,2)) == [1,3]
+    # balanced partitions: tasks in order of decreasing cost go to the partition with the lowest total cost
+    costs = [0,1,2,3,4]
+    assert shardIndices(5, (0,2), costs=costs) == [0,1,4] and shardIndices(5, (1,2), costs=costs) == [2,3]
+    self.assertRaises(ValueError, shardIndices, 5, (2,2))
+    # every task is executed in exactly one partition (exit code n; only task 0 succeeds)
+    args = [(n,) for n in range(5)]
+    ecs = [asyncPoolEC(test_func_ec, args, dict(wait=0), NP=NP, ldebug=ldebug, shard=(k,2), 
+                       cost_key=lambda arguments: arguments[0]) for k in range(2)]
+    assert ecs == [2,2]
+    
+  def testAsyncPoolFaults(self):
+    ''' test timeouts, retries and dead worker replacement in asyncPool '''    
+    from processing.multiprocess import asyncPoolEC, test_func_fault
+    args = [(n,) for n in range(4)] # succeed, hang, kill worker, fail
+    kwargs = dict(wait=1)
+    ec = asyncPoolEC(test_func_fault, args, kwargs, NP=NP, ldebug=ldebug, ltrialnerror=False, 
+                     timeout=3, retries=1, backoff=0.1)
+    assert ec == 3
+    
+  def testMemoryBudget(self):
+    ''' test admission control for tasks with a memory budget '''
+    from processing.multiprocess import applyWithBudget
+    import time
+    pool = multiprocessing.Pool(processes=NP)
+    finished = []
+    tasks = [(sleep, (0.2,), dict(), finished.append) for n in range(4)]
+    start = time.time()
+    results = applyWithBudget(pool, tasks, [1]*4, max_memory=1) # one task at a time
+    assert [result.get() for result in results] == [None]*4
+    assert time.time() - start > 0.75 and len(finished) == 4
+    # tasks that exceed the budget run alone
+    results = applyWithBudget(pool, [(np.sqrt, (4.,), dict(), None)]*2, [10,10], max_memory=1)
+    assert [result.get() for result in results] == [2.,2.]
+    pool.close(); pool.join()
+
+  def testCoreBudget(self):
+    ''' test core budgets for nested parallelism '''
+    from processing.multiprocess import CoreBudget, nestedPool, budgetedCall, apply_along_axis
+    budget = CoreBudget(ncpus=4)
+    budget.enterTask(); budget.enterTask()
+    assert budget.free == 2 and budget.share() == 2
+    assert budget.acquire(3, lblock=False) == 2 and budget.acquire(1, lblock=False) == 0
+    budget.release(2); budget.exitTask(); budget.exitTask()
+    assert budget.free == 4 and budget.share() == 4
+    # nested pools inside workers of a nestedPool
+    data = np.arange(2000, dtype='float').reshape((100,20))
+    pool = nestedPool(NP=NP, budget=budget)
+    results = [pool.apply_async(budgetedCall, (apply_along_axis, (np.mean, 1, data), dict(NP=4, chunksize=10))) 
+               for n in range(2)]
+    for result in results: assert isEqual(result.get(), data.mean(axis=1))
+    pool.close(); pool.join()
+    assert budget.free == 4
+    # children of nested workers are terminated with the workers
+    pool = nestedPool(NP=1, budget=budget)
+    pid = pool.apply_async(startChild).get()
+    pool.terminate(); pool.join()
+    if os.path.exists('/proc'): assert not os.path.exists('/proc/{:d}'.format(pid))
+    # daemonic processes without a budget run serially and warn
+    with self.assertLogs('multiprocess.apply_along_axis', level='WARNING'):
+      multiprocessing.current_process().daemon = True
+      try: assert isEqual(apply_along_axis(np.mean, 1, data, NP=4, chunksize=10), data.mean(axis=1))
+      finally: multiprocessing.current_process().daemon = False
+
+  def testClusterBackend(self):
+    ''' test execution on worker processes that are connected through sockets '''    
+    from processing.backends import ClusterBackend
+    from processing.multiprocess import apply_along_axis, asyncPoolEC, test_func_ec
+    data = np.arange(50000, dtype='float').reshape((500,100))
+    with ClusterBackend(nworkers=NP) as backend:
+      assert isEqual(apply_along_axis(np.mean, 1, data, NP=NP, pool=backend), data.mean(axis=1))
+      result = backend.apply_async(np.sqrt, (4.,))
+      assert result.get() == 2.
+      # remote exceptions are raised by get
+      self.assertRaises(TypeError, backend.apply_async(np.sqrt, ('four',)).get)
+      ec = asyncPoolEC(test_func_ec, [(n,) for n in range(5)], dict(wait=0), ldebug=ldebug, backend=backend)
+      assert ec == 4
+    # a worker that is started from the command line (runs as MainProcess)
+    import subprocess, processing.backends
+    from processing.multiprocess import test_func_fault
+    backend = ClusterBackend(nworkers=0, authkey=b'standalone')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    worker = subprocess.Popen([sys.executable, processing.backends.__file__, backend.address[0], 
+                               str(backend.address[1]), 'standalone'], env=env)
+    try:
+      assert asyncPoolEC(test_func_fault, [(0,),(0,),(3,)], dict(wait=0), ldebug=ldebug, backend=backend) == 1
+    finally:
+      backend.shutdown(nremote=1)
+      assert worker.wait(timeout=10) == 0
+    # tasks of workers that die fail, instead of blocking forever
+    with ClusterBackend(nworkers=1, heartbeat=0.2) as backend:
+      self.assertRaises(RuntimeError, backend.apply_async(os._exit, (1,)).get, timeout=10)
+
+  def testBufferPool(self):
+    ''' test serialization with out-of-band buffers and the BufferPool '''
+    from processing.serialize import sendObject, recvObject
+    from processing.backends import BufferPool
+    from processing.multiprocess import apply_along_axis
+    data = np.arange(50000, dtype='float').reshape((500,100))
+    # round trip through a pipe: arrays are received into writable buffers
+    # N.B.: the pipe buffer has to hold the entire message, since it is not read concurrently
+    small = data[:10,:10]
+    conn, child = multiprocessing.Pipe()
+    sendObject(conn, dict(data=small, transposed=small.T, name='test'))
+    obj = recvObject(child)
+    assert isEqual(obj['data'], small) and isEqual(obj['transposed'], small.T) and obj['name'] == 'test'
+    assert obj['data'].flags.writeable
+    with BufferPool(NP) as pool:
+      assert isEqual(apply_along_axis(np.mean, 1, data, NP=NP, pool=pool), data.mean(axis=1))
+      assert isEqual(pool.apply_async(np.multiply, (data, 2.)).get(), data*2.)
+      # worker affinity: tasks for the same worker are executed by the same process
+      pids = [[pool.apply_async(os.getpid, worker=n) for i in range(3)] for n in range(NP)]
+      pids = [set(result.get() for result in results) for results in pids]
+      assert all(len(worker) == 1 for worker in pids) and len(set.union(*pids)) == NP
+      self.assertRaises(TypeError, pool.apply_async(np.sqrt, ('four',)).get)
+      # idle workers that died are replaced and the task is sent to the new worker
+      for worker in list(pool.workers.values()): worker.kill(); worker.join()
+      assert isEqual(pool.apply_async(np.multiply, (data, 2.)).get(timeout=10), data*2.)
+      assert pool.apply_async(np.sqrt, (4.,), worker=0).get(timeout=10) == 2. and pool.starts[0] == 2
+
+
+if __name__ == "__main__":
+
+    
+    specific_tests = []
+#     specific_tests += ['ApplyAlongAxis']
+#     specific_tests += ['AsyncPool']    
+#     specific_tests += ['ExpArgList']
+
+
+    # list of tests to be performed
+    tests = [] 
+    # list of variable tests
+    tests += ['MultiProcess']
+    tests += ['Datasets'] 
+    
+
+    # construct dictionary of test classes defined above
+    test_classes = dict()
+    local_values = locals().copy()
+    for key,val in local_values.items():
+      if key[-4:] == 'Test':
+        test_classes[key[:-4]] = val
+
+
+    # run tests
+    report = []
+    for test in tests: # test+'.test'+specific_test
+      if len(specific_tests) > 0: 
+        test_names = ['misc_test.'+test+'Test.test'+s_t for s_t in specific_tests]
+        s = unittest.TestLoader().loadTestsFromNames(test_names)
+      else: s = unittest.TestLoader().loadTestsFromTestCase(test_classes[test])
+      report.append(unittest.TextTestRunner(verbosity=2).run(s))
+      
+    # print summary
+    runs = 0; errs = 0; fails = 0
+    for name,test in zip(tests,report):
+      #print test, dir(test)
+      runs += test.testsRun
+      e = len(test.errors)
+      errs += e
+      f = len(test.failures)
+      fails += f
+      if e+ f != 0: print(("\nErrors in '{:s}' Tests: {:s}".format(name,str(test))))
+    if errs + fails == 0:
+      print(("\n   ***   All {:d} Test(s) successfull!!!   ***   \n".format(runs)))
+    else:
+      print(("\n   ###     Test Summary:      ###   \n" + 
+            "   ###     Ran {:2d} Test(s)     ###   \n".format(runs) + 
+            "   ###      {:2d} Failure(s)     ###   \n".format(fails)+ 
+            "   ###      {:2d} Error(s)       ###   \n".format(errs)))
+    
\ No newline at end of file
@@ -0,0 +1,1003 @@
+'''
+Created on 2013-10-29
+
+
+A simple script to test the usage of pool and how to return values...
+
+@author: Andre R. Erler
+'''
+
+import multiprocessing
+import atexit
+import mmap
+import logging
+import sys
+import gc # garbage collection
+import types
+import os
+import signal
+import time
+import threading
+import warnings
+import numpy as np
+from datetime import datetime
+from time import sleep
+from multiprocessing.connection import wait
+# internal imports
+from processing.journal import taskKey, openJournal
+from processing.serialize import sendObject, recvObject
+from processing.shard import shardIndices
+
+
+## test functions
+
+global_var = 0
+
+# test apply_along_axis
+def test_aax_helper(arr, kw=0, axis=0): # lambda fct can't be pickled
+  return ( arr - np.mean(arr) ) / arr.std() - kw, kw
+ 
+def test_aax(arr, kw=0, axis=0): return test_aax_helper(arr, kw=kw)[0]
+ 
+def test_aax_mixed(arr, axis=0): # integer result for integer samples, otherwise float
+  return int(arr.max()) if np.all(arr == np.round(arr)) else arr.max()
+
+def test_noaax(arr, axis=0, kw=0):
+  shape = arr.shape[:-1]+(1,)
+  mean = np.mean(arr,axis=axis).reshape(shape)
+  std = np.std(arr,axis=axis).reshape(shape)
+  return (arr - mean) / std -kw
+
+
+def test_func(n, wait=None, queue=None):
+  global global_var
+#   print(n,global_var)
+  global_var = n
+#   print(n,global_var)
+  sleep(wait or n)  
+  print((n,global_var))
+  result = [n, 'hello', None]
+  if queue is not None:
+    queue.put(result)
+  else:
+    return result
+
+def test_mq(func, NP):
+  ''' using a managed queue '''
+  print('\n   ***   using managed queue   ***\n')
+  m = multiprocessing.Manager()
+  q =m.Queue()
+  pool = multiprocessing.Pool(processes=NP)
+  for n in range(NP):
+      pool.apply_async(func,(n,),dict(queue=q))
+  pool.close()
+  pool.join()
+  results = []
+  for n in range(NP): 
+    results.append(q.get())
+  for result in results:
+    print(result)
+  
+def test_async(func, NP):
+  ''' using pool async results '''
+  print('\n   ***   using pool async results   ***\n')    
+  pool = multiprocessing.Pool(processes=NP)
+  results = []
+  for n in range(NP):
+      result = pool.apply_async(func,(n,))
+      results.append(result)
+  pool.close()
+  pool.join()
+  #print('\n   ***   joined   ***\n')
+  results = [result.get() for result in results]
+  for result in results:
+    print(result)
+
+def test_func_ec(n, wait=1, lparallel=True, pidstr='', logger=None, ldebug=False):
+  ''' test function that conforms to asyncPool requirements '''
+  sleep(wait)  
+  pid = int(multiprocessing.current_process().name.split('-')[-1]) # start at 1
+  logger.info('{:s} Current Process ID: {:d}'.format(pidstr,pid))
+  assert int(pidstr[-3:-1]) == pid
+  # return n as exit code
+  return n 
+
+def test_func_dec(n, wait=1, lparallel=False, pidstr='', logger=None, ldebug=False):
+  ''' test function for decorator '''
+  sleep(wait)
+  pid = int(multiprocessing.current_process().name.split('-')[-1]) # start at 1
+  logger.info('{:s} Current Process ID: {:d}'.format(pidstr,pid))
+  assert int(pidstr[-3:-1]) == pid
+  
+def test_func_fault(n, wait=1, lparallel=True, pidstr='', logger=None, ldebug=False):
+  ''' test function for fault tolerance: 0 succeeds, 1 hangs, 2 kills its own worker and 3 fails '''
+  if n == 1: sleep(1000*wait)
+  elif n == 2: os.kill(os.getpid(), signal.SIGKILL) # like the OOM killer
+  return 1 if n == 3 else 0
+
+
+## production functions
+
+# determine number of CPUs and default number of processes
+def getCPUs():
+  ''' return the number of CPUs available to this process (this respects CPU affinity masks, e.g. from batch 
+      schedulers); sched_getaffinity is not available on all platforms, in which case cpu_count is used '''
+  if hasattr(os, 'sched_getaffinity'): return len(os.sched_getaffinity(0))
+  else: return os.cpu_count() or 1
+
+def getNP(NP=None, nthreads=None):
+  ''' return NP, or, if NP is None or 0, a sensible default: if the number of threads per worker is given, the
+      available CPUs are divided by nthreads, otherwise OMP_NUM_THREADS is used, if it is set, or the number of 
+      available CPUs '''
+  if NP: return int(NP)
+  if nthreads: return max(1, getCPUs()//nthreads)
+  if os.environ.get('OMP_NUM_THREADS'): return int(os.environ['OMP_NUM_THREADS'])
+  return getCPUs()
+
+def splitCores(NP=None, nthreads=None, ncpus=None):
+  ''' split the available cores (ncpus) between process-level (NP) and thread-level (nthreads) parallelism, such
+      that NP*nthreads does not exceed ncpus; missing values are inferred from the others and a tuple (NP, nthreads)
+      is returned; if neither is given, all cores are used for processes with one thread each '''
+  ncpus = ncpus or getCPUs()
+  if NP and nthreads: return int(NP), int(nthreads)
+  elif NP: return int(NP), max(1, ncpus//int(NP))
+  elif nthreads: return max(1, ncpus//int(nthreads)), int(nthreads)
+  else: return ncpus, 1
+
+# environment variables that control the size of native thread pools (BLAS, OpenMP etc.)
+thread_variables = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'BLIS_NUM_THREADS', 
+                    'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+def limitThreads(nthreads=1):
+  ''' worker initializer that limits the number of native (BLAS/OpenMP) threads per worker process to nthreads;
+      environment variables only affect libraries that are loaded later, so threadpoolctl is used as well to limit 
+      libraries that were already loaded (e.g. inherited from the parent process), if it is available '''
+  for var in thread_variables: os.environ[var] = str(nthreads)
+  try: 
+    from threadpoolctl import threadpool_limits
+  except ImportError: 
+    pass # only environment variables
+  else: 
+    threadpool_limits(limits=nthreads) # applies until the worker exits
+
+# select a start method for worker processes
+def getContext(start_method=None):
+  ''' return a multiprocessing context for start_method ('fork', 'forkserver' or 'spawn'); if the start method is
+      None or not available on this platform (e.g. 'fork' on Windows), the default context is returned instead '''
+  if start_method is not None and start_method in multiprocessing.get_all_start_methods():
+    return multiprocessing.get_context(start_method)
+  else: return multiprocessing.get_context()
+
+# a core budget that is shared between the levels of nested parallelism
+class CoreBudget(object):
+  ''' A budget of cores that is shared between worker processes, so that nested parallel calls (e.g. a parallel 
+      apply_along_axis inside an ensemble member method that runs in a worker) only use cores that are free: 
+      outer-level tasks hold one core while they run (see budgetedCall) and inner-level calls draw additional free 
+      cores (up to a fair share per running outer task), which are returned when they finish. The budget has to
+      be passed to worker processes when they are started (e.g. with nestedPool), not with individual tasks. '''
+  
+  def __init__(self, ncpus=None, context=None):
+    ''' initialize a budget of ncpus cores (default: all available CPUs) in shared memory '''
+    context = context or multiprocessing.get_context()
+    self.ncpus = ncpus or getCPUs()
+    self._free = context.RawValue('i', self.ncpus) # number of free cores
+    self._tasks = context.RawValue('i', 0) # number of running outer-level tasks
+    self._condition = context.Condition()
+    
+  @property
+  def free(self):
+    ''' number of cores that are currently free '''
+    return self._free.value
+  
+  def share(self):
+    ''' fair share of cores for each running outer-level task (including the core the task holds) '''
+    return max(1, self.ncpus//max(1, self._tasks.value))
+    
+  def acquire(self, ncores=1, lblock=True):
+    ''' take up to ncores cores from the budget and return the number of cores that were granted; if lblock is True,
+        wait until at least one core is free, otherwise the number of granted cores can be zero '''
+    with self._condition:
+      if lblock: self._condition.wait_for(lambda: self._free.value > 0)
+      granted = max(0, min(ncores, self._free.value))
+      self._free.value -= granted
+    return granted
+  
+  def release(self, ncores=1):
+    ''' return ncores cores to the budget '''
+    with self._condition:
+      self._free.value += ncores
+      self._condition.notify_all()
+      
+  def enterTask(self):
+    ''' register a running outer-level task and wait until it can hold a core '''
+    self.acquire(1, lblock=True)
+    with self._condition: self._tasks.value += 1
+    
+  def exitTask(self):
+    ''' unregister an outer-level task and release its core '''
+    with self._condition: self._tasks.value -= 1
+    self.release(1)
+
+# the core budget of this process (installed in workers by nestedPool)
+_budget = None
+
+def getBudget():
+  ''' return the core budget of this process, or None, if core budgeting is not used '''
+  return _budget
+
+def setBudget(budget):
+  ''' install a core budget in this process (e.g. as a worker initializer) and return the previous one '''
+  global _budget
+  previous = _budget; _budget = budget
+  return previous
+
+def budgetedCall(func, args=(), kwargs=None):
+  ''' call func(*args, **kwargs) as an outer-level task, i.e. while holding one core of the budget of this process 
+      (tasks wait, while inner-level calls use all cores); without a budget, func is just called '''
+  kwargs = kwargs or dict()
+  budget = _budget
+  if budget is None: return func(*args, **kwargs)
+  budget.enterTask()
+  try: return func(*args, **kwargs)
+  finally: budget.exitTask()
+
+def _terminateChildren(signum, frame):
+  ''' SIGTERM handler for nestedPool workers: terminate child processes (e.g. the workers of a nested pool) before
+      exiting, since they are not terminated with their parent (e.g. by Pool.terminate) and would be orphaned '''
+  children = multiprocessing.active_children()
+  for child in children: child.terminate()
+  for child in children: child.join(1)
+  os._exit(128+signum)
+
+def _initNested(budget, initializer=None, initargs=()):
+  ''' worker initializer for nestedPool: allow children and install the core budget '''
+  multiprocessing.current_process().daemon = False # pool workers are daemonic, which prevents nested pools
+  signal.signal(signal.SIGTERM, _terminateChildren) # non-daemonic workers have to clean up their children
+  setBudget(budget)
+  if initializer is not None: initializer(*initargs)
+
+def nestedPool(NP=None, budget=None, context=None, initializer=None, initargs=()):
+  ''' return a worker pool, whose workers can start their own worker pools (e.g. a parallel apply_along_axis inside 
+      an ensemble member method), and that share the core budget 'budget' (a CoreBudget; default: all available 
+      CPUs); tasks should be submitted with budgetedCall, so that nested calls only use free cores '''
+  context = context or multiprocessing.get_context()
+  budget = budget or CoreBudget(context=context)
+  return context.Pool(processes=NP or budget.ncpus, initializer=_initNested, initargs=(budget, initializer, initargs))
+
+# helper to create a new pool with limited native threads
+def _newPool(NP, nthreads=None):
+  ''' create a new worker pool with NP processes; if nthreads is not None, native threads are limited to nthreads
+      per worker (nthreads=0 divides available cores evenly between workers) '''
+  if nthreads is None: 
+    return multiprocessing.Pool(processes=NP)
+  else:
+    if nthreads == 0: NP, nthreads = splitCores(NP=NP)
+    return multiprocessing.Pool(processes=NP, initializer=limitThreads, initargs=(nthreads,))
+
+# module-managed persistent worker pool
+_pool = None
+_pool_NP = None
+
+def getPool(NP=None, nthreads=None):
+  ''' return a persistent, module-managed worker pool with NP processes; the pool is created on first use and 
+      reused by subsequent calls, so that consecutive calls do not pay for spawning and tearing down workers; 
+      a new pool is only created, if NP or nthreads (native threads per worker) change '''
+  global _pool, _pool_NP
+  NP = getNP(NP, nthreads=nthreads)
+  if _pool is None or _pool_NP != (NP,nthreads):
+    closePool() # shut down old pool with different size
+    _pool = _newPool(NP, nthreads=nthreads)
+    _pool_NP = (NP,nthreads)
+  return _pool
+
+def closePool():
+  ''' shut down the module-managed worker pool, if there is one '''
+  global _pool, _pool_NP
+  if _pool is not None:
+    _pool.close(); _pool.join()
+    _pool = None; _pool_NP = None
+atexit.register(closePool) # make sure workers are cleaned up
+
+# wrapper for concurrent.futures.Future that behaves like an AsyncResult
+class _FutureResult():
+  ''' minimal wrapper that provides the AsyncResult interface for a Future '''
+  def __init__(self, future): self.future = future
+  def get(self, timeout=None): return self.future.result(timeout=timeout)
+  def ready(self): return self.future.done()
+
+def _submit(pool, func, args=(), kwargs=None):
+  ''' submit a task to a multiprocessing pool or a concurrent.futures executor and return an AsyncResult-like object '''
+  kwargs = kwargs or dict()
+  if hasattr(pool, 'apply_async'): return pool.apply_async(func, args, kwargs)
+  elif hasattr(pool, 'submit'): return _FutureResult(pool.submit(func, *args, **kwargs))
+  else: raise TypeError(pool)
+
+# admission control for tasks with large memory footprints
+def applyWithBudget(pool, tasks, costs, max_memory):
+  ''' submit tasks (tuples of function, arguments, keyword arguments and callback) to a pool (or backend), but only
+      while the sum of the estimated costs (e.g. memory footprints in bytes) of the running tasks does not exceed 
+      max_memory; otherwise, wait for running tasks to finish, i.e. fewer workers are used concurrently instead of 
+      exceeding the budget (a task that exceeds the budget by itself runs alone); returns a list of AsyncResults '''
+  condition = threading.Condition()
+  running = dict() # task index: cost
+  def release(n, callback=None):
+    def finish(value):
+      try:
+        if callback is not None: callback(value)
+      finally:
+        with condition: 
+          running.pop(n); condition.notify_all()
+    return finish
+  results = []
+  for n,((func, args, kwargs, callback), cost) in enumerate(zip(tasks, costs)):
+    with condition:
+      while running and sum(running.values()) + cost > max_memory: condition.wait()
+      running[n] = cost
+    results.append(pool.apply_async(func, args, kwargs, callback=release(n, callback), error_callback=release(n)))
+  return results
+
+# a decorator class that handles loggers and exit codes for functions inside asyncPool_EC  
+class TrialNError():
+  ''' 
+    A decorator class that handles errors and returns an exit code for a pool worker function;
+    also handles loggers and some multiprocessing stuff. 
+  '''
+  
+  def __init__(self, func):
+    ''' Save original function in decorator class. '''
+    self.func = func
+    
+  def __call__(self, *args, **kwargs):
+    ''' connect to logger, figure out process ID, execute decorated function in try-block,
+        report errors, and return exit code '''
+    # input arguments
+    lparallel = kwargs['lparallel']
+    logger = kwargs['logger']
+    # type checks
+    if not isinstance(lparallel,bool): raise TypeError
+    if logger is not None and not isinstance(logger,str): raise TypeError
+
+    # logging
+    if logger is None: 
+      logger = logging.getLogger() # new logger
+      logger.addHandler(logging.StreamHandler())
+    else: logger = logging.getLogger(name=logger) # connect to existing one    
+    logger.propagate = False # suppress duplicate output
+    # parallelism
+    if lparallel:
+      name = multiprocessing.current_process().name.split('-')[-1]
+      # N.B.: pool workers are numbered (starting at 1), but e.g. a cluster worker that was started from the 
+      #       command line runs as 'MainProcess', in which case the system process ID is used
+      pid = int(name) if name.isdigit() else os.getpid()
+      pidstr = '[proc{0:02d}]'.format(pid) # pid for parallel mode output
+    else:
+      pidstr = '' # don't print process ID, sicne there is only one
+
+    # execute decorated function in try-block
+    kwargs['logger'] = logger
+    try:
+      # decorated function
+      ec = self.func(*args, pidstr=pidstr, **kwargs)
+      gc.collect() # enforce garbage collection
+      # return exit code
+      return ec or 0 # everything OK (and ec = None is OK, too)    
+    except Exception: # , err
+      # an error occurred
+      logging.exception(pidstr) # print stack trace of last exception and current process ID 
+      return 1 # indicate failure
+
+
+# worker process for the fault-tolerant scheduler used by asyncPoolEC
+def _ecWorker(conn, func, kwargs, initializer=None, initargs=()):
+  ''' receive task IDs and arguments through a pipe, execute func and send back the exit code; None terminates;
+      arguments are received with out-of-band buffers (see processing.serialize) '''
+  if initializer is not None: initializer(*initargs)
+  while True:
+    task = recvObject(conn)
+    if task is None: break
+    n, arguments = task
+    try: 
+      ec = func(*arguments, **kwargs)
+    except Exception:
+      logging.exception(multiprocessing.current_process().name) # print stack trace and process name
+      ec = 1 # indicate failure
+    conn.send((n, ec or 0))
+  conn.close()
+
+def _scheduleEC(func, args, kwargs, NP=None, nthreads=None, timeout=None, retries=0, backoff=1., logger=None, 
+                record=None):
+  ''' 
+    A fault-tolerant scheduler that executes func for every argument tuple in args on NP worker processes; 
+    tasks that exceed timeout (in seconds) are terminated, and tasks that fail or whose worker died are retried up 
+    to retries times, with an exponentially increasing delay (starting at backoff seconds); terminated or dead 
+    workers are replaced. Returns a list of exit codes (in the order of args) and a dict of failure reasons;
+    record(n, ec) is called as soon as the final exit code of task n is known.
+  '''
+  logger = logger or logging.getLogger()
+  if nthreads is None: initializer, initargs = None, ()
+  else:
+    if nthreads == 0: NP, nthreads = splitCores(NP=NP)
+    initializer, initargs = limitThreads, (nthreads,)
+  NP = min(getNP(NP, nthreads=nthreads), len(args))
+  exitcodes = [None]*len(args); attempts = [0]*len(args); reasons = dict()
+  pending = [(0., n) for n in range(len(args))] # earliest start time and task ID
+  workers = dict() # pipe connection: [process, task ID, start time]
+  slots = dict() # pipe connection: worker slot (1 to NP; replacements reuse the slot)
+  
+  def startWorker(slot):
+    # N.B.: TrialNError derives process IDs from names, so names are limited to the slot numbers
+    conn, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=_ecWorker, name='ECWorker-{:d}'.format(slot), 
+                                   args=(child, func, kwargs, initializer, initargs), daemon=True)
+    proc.start(); child.close()
+    workers[conn] = [proc, None, None]; slots[conn] = slot
+    
+  def stopWorker(conn, lterminate=False):
+    ''' shut down a worker and return its slot '''
+    proc = workers.pop(conn)[0]
+    if lterminate: proc.terminate()
+    else: 
+      try: sendObject(conn, None) # tell worker to exit
+      except (OSError, EOFError): pass # worker is already dead
+    proc.join(timeout=None if lterminate else 10)
+    if proc.is_alive(): proc.terminate()
+    conn.close()
+    return slots.pop(conn)
+      
+  def finishTask(n, ec, reason=None):
+    ''' record the exit code of a task or schedule a retry '''
+    if ec > 0 and attempts[n] < retries:
+      attempts[n] += 1
+      delay = backoff * 2**(attempts[n]-1)
+      logger.info('Task {:d} {:s}; retry {:d} of {:d} in {:g} seconds.'.format(n, reason or 'failed', attempts[n], retries, delay))
+      pending.append((time.time()+delay, n))
+    else:
+      exitcodes[n] = ec
+      if ec > 0: reasons[n] = reason or 'exit code {}'.format(ec)
+      if record is not None: record(n, ec)
+  
+  def collectResult(conn):
+    ''' receive a result from a worker; returns False, if the worker died '''
+    try: n, ec = conn.recv()
+    except (EOFError, OSError): return False
+    workers[conn][1:] = [None, None]
+    finishTask(n, ec)
+    return True
+  
+  for i in range(NP): startWorker(i+1)
+  while any(ec is None for ec in exitcodes):
+    now = time.time()
+    # distribute pending tasks to idle workers
+    pending.sort()
+    for conn,worker in list(workers.items()):
+      if worker[1] is None and pending and pending[0][0] <= now:
+        n = pending.pop(0)[1]
+        try: 
+          sendObject(conn, (n, args[n])) # large arrays are not copied into the pickle stream
+          worker[1:] = [n, now]
+        except (OSError, EOFError):
+          # idle worker died: the task was not started, so it is sent to the replacement
+          pending.insert(0, (now, n))
+          logger.info('Worker {:s} died (exit code {}); starting replacement.'.format(worker[0].name, worker[0].exitcode))
+          startWorker(stopWorker(conn))
+    # wait for results or dead workers, but not longer than the next deadline
+    deadlines = [start + timeout for proc,n,start in workers.values() if n is not None and timeout]
+    if any(worker[1] is None for worker in workers.values()): deadlines += [t for t,n in pending]
+    wait_time = max(0., min(deadlines + [now+1.]) - now)
+    sentinels = {worker[0].sentinel:conn for conn,worker in workers.items()}
+    ready = wait(list(workers.keys()) + list(sentinels.keys()), timeout=wait_time)
+    # collect results and replace dead workers
+    for obj in ready:
+      conn = sentinels.get(obj, obj)
+      if conn in workers and not (obj is conn and collectResult(conn)):
+        # worker died (EOF on pipe or process sentinel); results that were sent before are collected first
+        while conn.poll() and collectResult(conn): pass
+        proc, n, start = workers[conn]
+        slot = stopWorker(conn)
+        logger.info('Worker {:s} died (exit code {}); starting replacement.'.format(proc.name, proc.exitcode))
+        if n is not None: finishTask(n, 1, reason='worker died (exit code {})'.format(proc.exitcode))
+        startWorker(slot)
+    # terminate tasks that exceeded the timeout
+    now = time.time()
+    for conn,(proc,n,start) in list(workers.items()):
+      if timeout and n is not None and now - start > timeout:
+        slot = stopWorker(conn, lterminate=True)
+        logger.info('Task {:d} exceeded timeout of {:g} seconds; replacing worker {:s}.'.format(n, timeout, proc.name))
+        finishTask(n, 1, reason='timeout after {:g} seconds'.format(timeout))
+        startWorker(slot)
+  # shut down workers
+  for conn in list(workers.keys()): stopWorker(conn)
+  return exitcodes, reasons
+
+
+# run tasks on an execution backend
+def _backendEC(backend, func, args, kwargs, retries=0, backoff=1., logger=None, record=None):
+  ''' 
+    Execute func for every argument tuple in args on an execution backend (any object with a Pool-like apply_async
+    method, see processing.backends); failed tasks are resubmitted up to retries times, with an exponentially 
+    increasing delay; returns a list of exit codes and a dict of failure reasons (like _scheduleEC).
+  '''
+  logger = logger or logging.getLogger()
+  exitcodes = [None]*len(args); reasons = dict()
+  todo = list(range(len(args))); attempt = 0
+  while todo:
+    results = [(n,backend.apply_async(func, args[n], kwargs)) for n in todo]
+    todo = []
+    for n,result in results:
+      try: 
+        ec = result.get() or 0; reason = None
+      except Exception as err:
+        ec = 1; reason = 'exception: {}'.format(err)
+      if ec > 0 and attempt < retries: todo.append(n)
+      else:
+        exitcodes[n] = ec
+        if ec > 0: reasons[n] = reason or 'exit code {}'.format(ec)
+        if record is not None: record(n, ec)
+    if todo:
+      attempt += 1
+      logger.info('{:d} tasks failed; retry {:d} of {:d} in {:g} seconds.'.format(len(todo), attempt, retries, backoff*2**(attempt-1)))
+      sleep(backoff*2**(attempt-1))
+  return exitcodes, reasons
+
+
+def asyncPoolEC(func, args, kwargs, NP=1, ldebug=False, ltrialnerror=True, nthreads=None, timeout=None, retries=0, 
+                backoff=1., journal=None, backend=None, shard=None, cost_key=None):
+  ''' 
+    A function that executes func with arguments args (len(args) times) on NP number of processors;
+    args must be a list of argument tuples; kwargs are keyword arguments to func, which do not change
+    between calls.
+    Func is assumed to take a keyword argument lparallel to indicate parallel execution, and return 
+    a common exit status (0 = no error, > 0 for an error code).
+    If nthreads is not None, native (BLAS/OpenMP) threads are limited to nthreads per worker process 
+    (nthreads=0 divides the available cores evenly between workers).
+    In parallel mode, tasks that run longer than timeout seconds are terminated, and dead workers (e.g. killed by 
+    the OOM killer) are detected and replaced; failed tasks are retried up to retries times, with an exponentially
+    increasing delay, starting at backoff seconds (timeouts are not enforced in serial mode).
+    If a journal file (or TaskJournal) is given, completed tasks and their exit codes are recorded, keyed by a hash
+    of the function name, arguments and keyword arguments; when the same sweep is restarted, tasks that already 
+    completed successfully are skipped.
+    If an execution backend is given (e.g. a ClusterBackend, see processing.backends), tasks are submitted to the
+    backend instead of local worker processes (NP, nthreads and timeout are then ignored).
+    If shard=(k,n) is given, only the k-th of n deterministic partitions of args is executed (see shardIndices), so 
+    that independent jobs can split a sweep; partitions can be balanced with cost_key, a function that returns the
+    (estimated) cost of an argument tuple.
+    This function returns the number of failures as the exit code; argument tuples that failed permanently are 
+    listed in the summary. 
+  '''
+  # input checking
+  if not isinstance(func,types.FunctionType): raise TypeError
+  if not isinstance(args,list): raise TypeError
+  if not isinstance(kwargs,dict): raise TypeError
+  if NP is not None and not isinstance(NP,int): raise TypeError
+  if not isinstance(ldebug,(bool,np.bool_)): raise TypeError
+  if not isinstance(ltrialnerror,(bool,np.bool_)): raise TypeError
+  if nthreads is not None and not isinstance(nthreads,int): raise TypeError
+  if timeout is not None and not isinstance(timeout,(int,float)): raise TypeError
+  if not isinstance(retries,int): raise TypeError
+  kwargs = kwargs.copy() # logging and mode arguments are added below, but don't change the caller's dict
+  
+  # select partition of tasks
+  if shard is not None:
+    ntasks = len(args)
+    costs = None if cost_key is None else [cost_key(arguments) for arguments in args]
+    args = [args[n] for n in shardIndices(ntasks, shard, costs=costs)]
+  
+  # skip tasks that already completed successfully, according to the journal
+  journal = openJournal(journal)
+  if journal is not None:
+    keys = [taskKey(func.__name__, arguments, **kwargs) for arguments in args]
+    todo = [n for n,key in enumerate(keys) if journal.exitcode(key) != 0]
+  else: todo = list(range(len(args)))
+  
+  # figure out if running parallel
+  if NP is not None and NP == 1 and backend is None: lparallel = False
+  else: lparallel = True
+  kwargs['ldebug'] = ldebug
+  kwargs['lparallel'] = lparallel  
+
+  # logging level
+  if ldebug: loglevel = logging.DEBUG
+  else: loglevel = logging.INFO
+  # set up parallel logging (multiprocessing)
+  if lparallel:
+    multiprocessing.log_to_stderr()
+    mplogger = multiprocessing.get_logger()
+    #if ldebug: mplogger.setLevel(logging.DEBUG)
+    if ldebug: mplogger.setLevel(logging.INFO)
+    else: mplogger.setLevel(logging.ERROR)
+  # set up general logging
+  logger = logging.getLogger('multiprocess.asyncPoolEC') # standard logger
+  logger.setLevel(loglevel)
+  if not logger.handlers: # only add handler once, in case of repeated calls
+    ch = logging.StreamHandler(sys.stdout) # stdout, not stderr
+    ch.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(ch)
+  for ch in logger.handlers: ch.setLevel(loglevel)
+  kwargs['logger'] = logger.name
+#   # process sub logger
+#   sublogger = logging.getLogger('multiprocess.asyncPoolEC.func') # standard logger
+#   sublogger.propagate = False # only print message in this logger
+#   sch = logging.StreamHandler(sys.stdout) # stdout, not stderr
+#   sch.setLevel(loglevel)
+#   if lparallel: fmt = logging.Formatter('[%(processName)s] %(message)s')
+#   else: fmt = logging.Formatter('%(message)s')
+#   sch.setFormatter(fmt)
+#   sublogger.addHandler(sch)
+#   kwargs['logger'] = sublogger.name
+  
+  # apply decorator
+  if ltrialnerror: func = TrialNError(func)
+  
+  # print first logging message
+  logger.info(datetime.today())
+  logger.info('\nTHREADS: {0:s}, DEBUG: {1:s}\n'.format(str(NP),str(ldebug)))
+  if shard is not None:
+    logger.info('Shard {:d} of {:d}: {:d} of {:d} tasks\n'.format(shard[0], shard[1], len(args), ntasks))
+  if len(todo) < len(args):
+    logger.info('Skipping {:d} tasks that were already completed (journal: {:s})\n'.format(len(args)-len(todo), journal.filename))
+  def record(n, ec):
+    # record final exit code of task n in the journal
+    if journal is not None: journal.record(keys[todo[n]], ec=ec)
+  ## loop over and process all job sets
+  if backend is not None:
+    # submit tasks to an execution backend (e.g. remote workers)
+    ecs, reasons = _backendEC(backend, func, [args[n] for n in todo], kwargs, retries=retries, backoff=backoff, 
+                              logger=logger, record=record)
+    reasons = {todo[n]:reason for n,reason in reasons.items()}
+  elif lparallel:
+    # distribute tasks to workers, using a fault-tolerant scheduler (timeouts, retries and dead worker detection)
+    ecs, reasons = _scheduleEC(func, [args[n] for n in todo], kwargs, NP=NP, nthreads=nthreads, timeout=timeout, 
+                               retries=retries, backoff=backoff, logger=logger, record=record)
+    reasons = {todo[n]:reason for n,reason in reasons.items()}
+    logger.debug('\n   ***   all processes joined   ***   \n')
+  else:
+    # don't parallelize, if there is only one process: just loop over files    
+    ecs = []; reasons = dict()
+    for n,arguments in enumerate([args[n] for n in todo]):
+      for attempt in range(retries+1):
+        ec = func(*arguments, **kwargs) or 0
+        if ec <= 0 or attempt == retries: break
+        logger.info('Task {:d} failed; retry {:d} of {:d} in {:g} seconds.'.format(todo[n], attempt+1, retries, backoff*2**attempt))
+        sleep(backoff*2**attempt)
+      if ec > 0: reasons[todo[n]] = 'exit code {}'.format(ec)
+      record(n, ec)
+      ecs.append(ec)
+  exitcodes = [0]*len(args) # skipped tasks were successful
+  for n,ec in zip(todo,ecs): exitcodes[n] = ec
+    
+  # evaluate exit codes    
+  exitcode = 0
+  for ec in exitcodes:
+    if ec < 0: raise ValueError('Exit codes have to be zero or positive!') 
+    elif ec > 0: ec = 1
+    # else ec = 0, i.e. no errors
+    exitcode += ec
+  nop = len(args) - exitcode
+  
+  # print summary (to log)
+  if exitcode == 0:
+    logger.info('\n   >>>   All {:d} operations completed successfully!!!   <<<   \n'.format(nop))
+  else:
+    logger.info('\n   ===   {:2d} operations completed successfully!    ===   \n'.format(nop) +
+          '\n   ###   {:2d} operations did not complete/failed!   ###   \n'.format(exitcode))
+    for n,reason in sorted(reasons.items()):
+      logger.info('   ###   failed permanently: {} ({:s})'.format(args[n], reason))
+  logger.info(datetime.today())
+  # return with exit code
+  return exitcode
+
+# helper function to tile the leading dimensions of an array without reshaping
+def _tile_indices(rowshape, chunksize):
+  ''' generate index tuples that tile an array with leading dimensions rowshape into blocks with at most
+      chunksize rows (but at least one row); tiles follow the original memory layout, so that no
+      contiguous copy of the entire array is necessary '''
+  # find the outermost dimension that has to be split, so that tiles are smaller than chunksize
+  d = len(rowshape); inner = 1
+  while d > 0 and inner*rowshape[d-1] <= chunksize:
+    d -= 1; inner *= rowshape[d]
+  if d == 0: 
+    yield () # everything fits into one tile
+  else:
+    n = rowshape[d-1]; k = max(1,chunksize//inner) # number of slices along split dimension
+    for outer in np.ndindex(*rowshape[:d-1]):
+      for i in range(0,n,k): yield outer + (slice(i,min(i+k,n)),)
+
+# helper function that is executed by the workers
+def _apply_chunk(fct, chunk, laax, args, kwargs, nout=None):
+  ''' apply fct to a chunk of sample rows; the chunk is only flattened (and copied) here; if nout is not None,
+      fct has to return a tuple of nout outputs and a tuple of nout arrays is returned '''
+  chunk = chunk.reshape((-1,chunk.shape[-1])) # sample axis is always last
+  if nout is None:
+    if laax: return np.apply_along_axis(fct, 1, chunk, *args, **kwargs)
+    else: return fct(chunk, *args, **kwargs)
+  elif laax:
+    # loop over rows and fill one pre-allocated array per output
+    outputs = None
+    for i,row in enumerate(chunk):
+      results = fct(row, *args, **kwargs)
+      if len(results) != nout: raise ValueError("Expected {:d} outputs, received {:d}.".format(nout,len(results)))
+      if outputs is None: 
+        outputs = tuple(np.empty((len(chunk),)+np.shape(result), dtype=np.asarray(result).dtype) for result in results)
+      for output,result in zip(outputs,results): output[i] = result
+    return outputs
+  else:
+    outputs = tuple(fct(chunk, *args, **kwargs))
+    if len(outputs) != nout: raise ValueError("Expected {:d} outputs, received {:d}.".format(nout,len(outputs)))
+    return outputs
+
+# helpers for memory-mapped input arrays
+def _memmapSource(data):
+  ''' return a picklable description (filename, dtype, shape, offset, order) of a contiguous memory-mapped array,
+      so that workers can open the mapping themselves; views are supported, as long as they are contiguous; returns 
+      None, if the array is not backed by a file (e.g. a copy or the result of an operation on a memmap) '''
+  root = data # the array that owns the mapping
+  while isinstance(root.base, np.memmap): root = root.base
+  if not isinstance(root.base, mmap.mmap) or root.filename is None: return None
+  if data.flags.c_contiguous: order = 'C'
+  elif data.flags.f_contiguous: order = 'F'
+  else: raise ValueError("Memory-mapped input arrays have to be contiguous.")
+  # N.B.: views inherit the offset of the original mapping, so the actual position in the file has to be computed
+  #       from the memory address relative to the owner of the mapping, which starts at its offset in the file
+  offset = root.offset + data.ctypes.data - root.ctypes.data
+  return root.filename, data.dtype, data.shape, offset, order
+
+def _apply_memmap_chunk(fct, source, axis, tile, laax, args, kwargs, nout=None):
+  ''' open the memory-mapped input array in the worker and process only the rows in tile '''
+  filename, dtype, shape, offset, order = source
+  data = np.memmap(filename, dtype=dtype, mode='r', shape=shape, offset=offset, order=order)
+  if not axis == data.ndim-1:
+    data = np.rollaxis(data, axis=axis, start=data.ndim) # roll sample axis to last (innermost) position
+  return _apply_chunk(fct, data[tile], laax, args, kwargs, nout)
+
+# helper function to restore the original array shape and axis order
+def _reassemble(output, arrayshape, ndim, axis):
+  ''' reshape an output array with flattened or tiled leading dimensions to the original array shape, and roll 
+      the sample axis back into its original position; scalar results reduce the sample axis and outputs with
+      more than one dimension per sample are appended at the end '''
+  results = np.reshape(output, arrayshape+output.shape[ndim:]) # output is contiguous, so this is only a view
+  assert results.shape[:len(arrayshape)] == arrayshape
+  if results.ndim == len(arrayshape)+1 and not axis == results.ndim-1: # if the sample dimension was replaced
+    results = np.rollaxis(results, axis=results.ndim-1, start=axis) # roll sample axis back to original position
+  return results
+
+# helpers for the compaction of invalid samples
+def _promote(output, dtype, filename=None):
+  ''' return a copy of a (partially filled) output array with a wider dtype; memory-mapped outputs are copied to a 
+      new file that replaces the old file '''
+  if filename is None: return output.astype(dtype)
+  promoted = np.lib.format.open_memmap(filename+'.tmp', mode='w+', dtype=dtype, shape=output.shape)
+  promoted[...] = output; promoted.flush()
+  os.replace(filename+'.tmp', filename) # the mapping remains valid
+  return promoted
+
+def _validRows(rows):
+  ''' return a boolean array that is False for samples (along the last axis) that are entirely masked or NaN '''
+  invalid = np.ma.getmaskarray(rows)
+  if np.issubdtype(rows.dtype, np.inexact): invalid = invalid | np.isnan(np.ma.getdata(rows))
+  return ~invalid.all(axis=-1)
+
+def _scatter(result, valid, fill_value):
+  ''' insert the results for the valid rows into an array with one row per sample, and fill_value elsewhere; the
+      result type is only promoted (e.g. from integer to float for NaN), if fill_value is actually inserted '''
+  if valid.all(): return result
+  output = np.full(valid.shape+result.shape[1:], fill_value, dtype=np.result_type(result.dtype, fill_value))
+  output[valid] = result
+  return output
+
+def apply_along_axis(fct, axis, data, NP=0, chunksize=200, ldebug=False, laax=True, *args, lcopy=True, nout=None, 
+                     pool=None, nthreads=None, mm_dtype=None, mm_shape=None, mm_offset=0, outfile=None, lcompact=False, 
+                     fill_value=np.nan, **kwargs):
+  ''' a parallelized version of numpy's apply_along_axis; the preferred way of passing arguments is,
+      by using functools.partial, but arguments can also be passed to this function; the call-signature
+      is the same as for np.apply_along_axis, except for NP=getNP(), chunksize=200, 
+      ldebug=False, and laax=True; the latter can be set to False, if fct is fully vectorized and only
+      the parallelization feature is required, otherwise Numpy's apply_along_axis will be called within
+      child processes. 
+      If lcopy=False, the input array is not rolled and flattened into a contiguous copy; instead, strided
+      tiles of the original array are sent to the workers and only copied one chunk at a time (memory-lean 
+      mode); results are always written into a pre-allocated output array. 
+      If fct returns several outputs (e.g. fit parameters, errors and p-values), nout can be set to the number of
+      outputs; all outputs are computed in a single pass and returned as a tuple of arrays. 
+      By default, a new worker pool is created for every call; alternatively, an existing multiprocessing pool, 
+      concurrent.futures executor or execution backend (see processing.backends) can be passed as pool (it will not 
+      be closed), or pool=True can be used to reuse the persistent module-managed pool (see getPool). 
+      If nthreads is not None, native (BLAS/OpenMP) threads are limited to nthreads per worker process, in order
+      to avoid oversubscription (nthreads=0 divides the available cores evenly between workers). 
+      For arrays that are larger than memory, data can be a np.memmap or a file path (a .npy file or a raw 
+      binary file with mm_dtype, mm_shape and mm_offset); workers open the mapping themselves and only process their tiles,
+      so that the input array is never loaded or pickled as a whole. If outfile is given (a list of files, if nout
+      is set), results are written to memory-mapped .npy files instead of memory. 
+      If this process has a core budget (e.g. in a worker of a nestedPool, see CoreBudget), only free cores are used
+      for the worker pool (the calling process lends its own core), up to a fair share per running outer-level task;
+      otherwise, in daemonic worker processes, which can not start a worker pool, the computation runs serially. 
+      If lcompact=True, samples that are entirely masked or NaN (e.g. land or ocean points) are not processed: only
+      valid samples are compacted into chunks and sent to the workers, and fill_value is inserted in the results
+      for invalid samples (the result type is promoted, if necessary); if all samples are invalid, fct is applied to
+      one invalid sample to determine the shape of the results. Compaction is not supported for memory-mapped input
+      or output. '''  
+  NP = getNP(NP, nthreads=nthreads)
+  budget = getBudget(); extra = 0
+  if pool is None or pool is True:
+    if budget is not None: 
+      extra = budget.acquire(min(NP, budget.share())-1, lblock=False) # cores in addition to the calling process
+      NP = extra + 1
+    elif multiprocessing.current_process().daemon and NP > 1: 
+      # daemonic processes can't have children
+      logging.getLogger('multiprocess.apply_along_axis').warning(
+        "Daemonic process '{}' can not start a worker pool without a core budget (see nestedPool); running serially "
+        "instead of with {:d} processes.".format(multiprocessing.current_process().name, NP))
+      NP = 1
+  try: 
+    if not lcompact:
+      return _apply_along_axis(fct, axis, data, NP, chunksize, ldebug, laax, args, lcopy, nout, pool, nthreads, 
+                               mm_dtype, mm_shape, mm_offset, outfile, kwargs)
+    # only process valid samples and scatter results back
+    if isinstance(data, (str,np.memmap)) or outfile is not None: 
+      raise NotImplementedError("Compaction of memory-mapped input or output is not supported.")
+    view = np.moveaxis(data, axis, -1) # sample axis last (only a view)
+    arrayshape = view.shape[:-1]
+    valid = _validRows(view)
+    if ldebug: print(("Valid samples: {:d} of {:d}".format(int(valid.sum()),valid.size)))
+    if valid.any():
+      # N.B.: valid samples are gathered directly from the view, so the input is only copied once
+      results = _apply_along_axis(fct, 1, view[valid], NP, chunksize, ldebug, laax, args, lcopy, nout, pool, 
+                                  nthreads, mm_dtype, mm_shape, mm_offset, outfile, kwargs)
+    else: 
+      # nothing to do, but the shape and type of the results are determined by applying fct to an invalid sample
+      probe = view[(0,)*len(arrayshape)].reshape((1,-1))
+      try: 
+        with warnings.catch_warnings(), np.errstate(all='ignore'):
+          warnings.simplefilter('ignore')
+          results = _apply_chunk(fct, probe, laax, args, kwargs if laax else dict(kwargs, axis=1), nout)
+      except Exception as err:
+        raise ValueError("All samples are invalid and fct can not be applied to an invalid sample, so the shape of "
+                         "the results is unknown.") from err
+      results = results[:0] if nout is None else tuple(result[:0] for result in results)
+    if nout is None: results = (results,)
+    valid = valid.ravel()
+    results = tuple(_reassemble(_scatter(result, valid, fill_value), arrayshape, 1, axis) for result in results)
+    return results if nout else results[0]
+  finally: 
+    if extra > 0: budget.release(extra)
+
+def _apply_along_axis(fct, axis, data, NP, chunksize, ldebug, laax, args, lcopy, nout, pool, nthreads, mm_dtype, 
+                      mm_shape, mm_offset, outfile, kwargs):
+  ''' implementation of apply_along_axis, with the final number of worker processes '''
+  # memory-mapped input: workers will open the mapping themselves
+  if isinstance(data, str):
+    if mm_dtype is None and mm_shape is None: data = np.load(data, mmap_mode='r') # .npy file with header
+    else: data = np.memmap(data, dtype=mm_dtype, mode='r', shape=mm_shape, offset=mm_offset)
+  source = _memmapSource(data) if isinstance(data, np.memmap) else None
+  if source is not None: lcopy = False # never load the entire array
+  if isinstance(outfile, str): outfile = (outfile,)
+  if outfile is not None and len(outfile) != (nout or 1): raise ValueError("Need one output file per output.")
+  # pre-processing: move sample axis to the back (this is only a view)
+  if not axis == data.ndim-1:
+    data = np.rollaxis(data, axis=axis, start=data.ndim) # roll sample axis to last (innermost) position
+  arrayshape,samplesize = data.shape[:-1],data.shape[-1]
+  arraysize = int(np.prod(arrayshape))
+  if lcopy:
+    # flatten array for redistribution (N.B.: this creates a copy, unless the sample axis was last)
+    data = np.reshape(data,(arraysize,samplesize))
+  rowshape = data.shape[:-1] # leading dimensions that are tiled
+  # compute
+  if chunksize == 0: chunksize = 1 
+  if not laax: kwargs['axis'] = 1 # for ufunc-like functions
+  elif len(kwargs) > 0: raise NotImplementedError("np.apply_along_axis doesn't take kwargs")
+  if ldebug: print(("Arraysize: {}, Chunksize: {}".format(arraysize,chunksize)))
+  workers = None
+  if (NP == 1 or arraysize < 1.1*chunksize):
+    # just use regular Numpy version... but always apply over last dimension
+    if ldebug: print('\n   ***   Running in Serial Mode   ***')
+    tiles = [()] if lcopy else list(_tile_indices(rowshape, chunksize))
+    results = (_apply_chunk(fct, data[tile], laax, args, kwargs, nout) for tile in tiles) # memmaps are read lazily
+  else:
+    # adjust number of processors
+    pool_NP = NP
+    NP = int(min(NP,np.around(arraysize/chunksize)))
+    if ldebug: print(('NP: {}'.format(NP)))
+    # split up data
+    if arraysize < (NP+1)*chunksize:
+      cs = int(arraysize//NP) # chunksize; use integer division
+      if arraysize%NP != 0: cs += 1
+    else:
+      cs = chunksize
+    tiles = list(_tile_indices(rowshape, cs)) # index tuples for views on subsets of the data
+    # initialize worker pool
+    if pool is None:
+      if ldebug: print('\n   ***   firing up pool (using async results)   ***')
+      if ldebug: print(('         OMP_NUM_THREADS = {:d}\n'.format(NP)))
+      workers = _newPool(NP, nthreads=nthreads)
+    elif pool is True: 
+      workers = getPool(NP=pool_NP, nthreads=nthreads) # persistent pool; NP before adjustment, so that it can be reused
+    else: workers = pool # externally supplied pool or executor
+    results = [] # list of resulting chunks (assembled later)
+    for n,tile in enumerate(tiles):
+      # run computation on individual subsets/chunks
+      if ldebug: print(('   Starting Chunk #{:d}'.format(n+1)))
+      if source is None: 
+        results.append(_submit(workers, _apply_chunk, (fct, data[tile], laax, args, kwargs, nout)))
+      else: # only send a description of the memory map and the tile 
+        results.append(_submit(workers, _apply_memmap_chunk, (fct, source, axis, tile, laax, args, kwargs, nout)))
+    if pool is None: workers.close()
+    if ldebug: print('\n   ***   getting results from worker pool   ***\n')
+    results = (result.get() for result in results)
+  # retrieve results and write into pre-allocated output arrays (one per output)
+  try:
+    outputs = None
+    for tile,result in zip(tiles,results):
+      if nout is None: result = (result,)
+      if outputs is None: 
+        if outfile is None: outputs = [np.empty(rowshape+res.shape[1:], dtype=res.dtype) for res in result]
+        else: outputs = [np.lib.format.open_memmap(filename, mode='w+', dtype=res.dtype, shape=rowshape+res.shape[1:]) 
+                         for filename,res in zip(outfile,result)]
+      for n,(output,res) in enumerate(zip(outputs,result)):
+        dtype = np.result_type(output.dtype, res.dtype)
+        if dtype != output.dtype: # later chunks can have a wider type (promote like np.concatenate)
+          output = outputs[n] = _promote(output, dtype, None if outfile is None else outfile[n])
+        output[tile] = res.reshape(output[tile].shape)
+  except:
+    if pool is None and workers is not None: workers.terminate() # don't wait for the remaining chunks
+    raise
+  finally:
+    if pool is None and workers is not None: workers.join()
+  if outfile is not None:
+    for output in outputs: output.flush()
+  # check and reshape
+  results = tuple(_reassemble(output, arrayshape, len(rowshape), axis) for output in outputs)
+  if nout is None: results = results[0]
+  # return results
+  return results
+
+if __name__ == '__main__':
+
+  NP = 4
+  from geodata.misc import isEqual, isZero
+  from functools import partial
+  # test apply_along_axis
+  axis = 1
+  def func(arr, kw=0, axis=0): # lambda fct can't be pickled
+    return ( arr - np.mean(arr) ) / arr.std() - kw, kw
+   
+  def func1(arr, kw=0, axis=0): return func(arr, kw=kw)[0]
+   
+  def nolaax(arr, axis=0, kw=0):
+    shape = arr.shape[:-1]+(1,)
+    mean = np.mean(arr,axis=axis).reshape(shape)
+    std = np.std(arr,axis=axis).reshape(shape)
+    return (arr - mean) / std -kw
+  
+  def run_test(fct, kw=0, laax=True):
+    ff = partial(fct, kw=kw)
+    shape = (500,100)
+    data = np.arange(np.prod(shape), dtype='float').reshape(shape)
+    assert data.shape == shape
+    # parallel implementation using my wrapper
+    pres = apply_along_axis(ff, axis, data, NP=2, ldebug=True, laax=laax)
+    print(pres.shape)
+    assert pres.shape == data.shape
+    assert isZero(pres.mean(axis=axis)+kw) and isZero(pres.std(axis=axis)-1.)
+    # straight-forward numpy version
+    res = np.apply_along_axis(ff, axis, data)
+    assert res.shape == data.shape
+    assert isZero(res.mean(axis=axis)+kw) and isZero(res.std(axis=axis)-1.)
+    # final test
+    assert isEqual(pres, res) 
+    
+  # run tests 
+  run_test(nolaax, kw=1, laax=False) # without Numpy's apply_along_axis
+  run_test(func1, kw=1, laax=True) # Numpy's apply_along_axis
+  
+  #print logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL
+    
+  #test_mq(test_func, NP)
+#   print(global_var)
+#   test_async(test_func, NP)
+#   print(global_var)
+  
+  # test asyncPool
+#   args = [(n,) for n in xrange(5)]
+#   kwargs = dict(wait=1)
+#   asyncPoolEC(test_func_dec, args, kwargs, NP=NP, ldebug=True, ltrialnerror=True)
+  #asyncPoolEC(test_func_ec, args, kwargs, NP=NP, ldebug=True)
+  
@@ -0,0 +1,47 @@
+'''
+Created on 2026-10-18
+
+A serialization layer for sending objects with large NumPy arrays between processes, using pickle protocol 5 with
+out-of-band buffers: array data is not copied into the pickle stream, but sent directly from the array memory over
+the connection, and received into pre-allocated (writable) buffers that the arrays are reconstructed on.
+
+@author: Andre R. Erler, GPL v3
+'''
+
+import pickle
+
+
+# serialize objects with out-of-band buffers
+def dumps(obj):
+  ''' serialize obj with pickle protocol 5 and return the pickle stream and a list of out-of-band buffers (e.g. the
+      data of contiguous arrays), which are not copied into the stream '''
+  buffers = []
+  data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+  return data, buffers
+
+def loads(data, buffers=()):
+  ''' reconstruct an object from a pickle stream and its out-of-band buffers '''
+  return pickle.loads(data, buffers=buffers)
+
+
+# send and receive objects through a multiprocessing connection
+def sendObject(conn, obj):
+  ''' send obj through a connection (e.g. a Pipe): a header with the buffer sizes, the pickle stream, and every
+      out-of-band buffer as a separate message, directly from the memory of the original object '''
+  data, buffers = dumps(obj) # serialize completely before sending anything
+  raws = [buffer.raw() for buffer in buffers]
+  conn.send([raw.nbytes for raw in raws])
+  conn.send_bytes(data)
+  for raw in raws: conn.send_bytes(raw)
+
+def recvObject(conn):
+  ''' receive an object that was sent with sendObject; buffers are received into pre-allocated bytearrays, so that
+      arrays are writable and no additional copies are made '''
+  sizes = conn.recv()
+  data = conn.recv_bytes()
+  buffers = []
+  for size in sizes:
+    buffer = bytearray(size)
+    conn.recv_bytes_into(buffer)
+    buffers.append(buffer)
+  return loads(data, buffers)
@@ -0,0 +1,32 @@
+'''
+Created on 2026-10-18
+
+Deterministic partitioning of task lists, so that independent jobs can split a sweep without coordination; this
+module has no dependencies, so that it can be imported without loading the multiprocessing tools.
+
+@author: Andre R. Erler, GPL v3
+'''
+
+import heapq
+import numbers
+
+
+# deterministic partitioning of task lists
+def shardIndices(ntasks, shard, costs=None):
+  ''' return the indices of the tasks in partition k of n (shard=(k,n)), such that independent processes can split
+      a list of ntasks tasks without coordination: by default, tasks are assigned round-robin (without generating 
+      the other partitions); if costs are given, tasks are assigned in order of decreasing cost to the partition with 
+      the lowest total cost, which balances the partitions (ties are broken by index, so the result is deterministic) '''
+  if not isinstance(shard,(tuple,list)) or len(shard) != 2: raise TypeError(shard)
+  k, n = shard
+  if not isinstance(k,numbers.Integral) or not isinstance(n,numbers.Integral): raise TypeError(shard)
+  if n < 1 or not 0 <= k < n: raise ValueError("Invalid shard: {} (need 0 <= k < n)".format(shard))
+  if costs is None: return list(range(k, ntasks, n))
+  if len(costs) != ntasks: raise ValueError("Need one cost value for every task.")
+  loads = [(0, m) for m in range(n)] # heap of total cost and partition index
+  indices = []
+  for i in sorted(range(ntasks), key=lambda i: (-costs[i], i)):
+    load, m = heapq.heappop(loads)
+    if m == k: indices.append(i)
+    heapq.heappush(loads, (load+costs[i], m))
+  return sorted(indices)